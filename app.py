@@ -1,21 +1,75 @@
 # app.py
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-import pandas as pd
 import database
 import ml_models
+import ml_numpy
+import importer
+import recurring
+import http_cache
+import compression
+import metrics
+import log_setup
 import logging
 import datetime
+import click
+from lazy import LazyModule, measure_import_times
+
+pd = LazyModule('pandas')
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'
 app.config['JSON_SORT_KEYS'] = False
 
+# SQLite connection pool (see database.configure)
+app.config['DATABASE'] = 'finance.db'
+app.config['DATABASE_POOL_SIZE'] = 8
+app.config['DATABASE_STATEMENT_CACHE_SIZE'] = 256
+app.config['DATABASE_BUSY_TIMEOUT'] = 30.0
+app.config['DATABASE_PRAGMAS'] = {}
+app.config['DATABASE_CHECK_QUERY_PLANS'] = True
+app.config['DATABASE_SHARED_VERSIONS'] = True  # cache versions from the database; False only if no other process ever writes
+app.config['TRANSACTION_CACHE_SIZE'] = 128  # users whose prepared DataFrame is kept in memory
+app.config['FORECAST_WORKERS'] = 2  # ARIMA fit processes; 0 fits inline
+app.config['FORECAST_CACHE_SIZE'] = 1024
+app.config['ANALYTICS_ENGINE'] = 'pandas'  # or 'numpy' for the ml_numpy fast path
+app.config['TRANSACTIONS_PAGE_MAX'] = 1000  # largest /get_transactions?limit=
+app.config['TRANSACTIONS_STREAM_BATCH'] = 500  # rows fetched and written per chunk by /get_transactions?stream=1
+app.config['IMPORT_CHUNK_SIZE'] = 5000  # rows normalized and inserted per executemany in bulk imports (one commit per import)
+app.config['IMPORT_MAX_ROWS'] = 1_000_000  # largest import; files are parsed in memory before the write transaction
+app.config['RECURRING_INTERVAL'] = 3600  # seconds between recurring-transaction materializer runs; 0 disables the thread
+app.config['HTTP_CACHE_ENTRIES'] = 4096  # cached GET response bodies, across users
+app.config['HTTP_CACHE_BYTES'] = 32 * 1024 * 1024  # total size bound for those bodies
+app.config['HTTP_CACHE_MAX_AGE'] = 0  # seconds browsers may reuse a response unchecked; 0 always revalidates
+app.config['COMPRESS_LEVEL'] = 6  # gzip/deflate level for text responses the client accepts compressed; 0 disables
+app.config['COMPRESS_MIN_SIZE'] = 1024  # bytes; smaller bodies are sent as they are
+app.config['METRICS_ENABLED'] = True  # time database/ml calls and count SQL per request; exported at /metrics
+app.config['METRICS_SERVER_TIMING'] = False  # also send each request's breakdown in a Server-Timing header
+app.config['USER_CACHE_SIZE'] = 1024  # logged-in users kept in memory by load_user
+app.config['USER_CACHE_TTL'] = 60  # seconds before a cached user is re-read; 0 disables the cache
+app.config['ASYNC_DB_WORKERS'] = 0  # asgi.py: threads running requests; 0 means DATABASE_POOL_SIZE
+app.config['ASYNC_CPU_WORKERS'] = 2  # asgi.py: processes for the ASYNC_CPU_ROUTES; 0 runs them on the threads
+app.config['ASYNC_CPU_ROUTES'] = ('/dashboard', '/budget', '/budget_alerts', '/investments', '/offers', '/forecast')
+app.config['LOG_LEVEL'] = 'INFO'
+app.config['LOG_LEVELS'] = {}  # per-logger overrides, e.g. {'database': 'DEBUG', 'app.payload': 'DEBUG'}
+app.config['LOG_PAYLOAD_SAMPLE_RATE'] = 0.01  # share of DEBUG payload records ('*.payload' loggers) written
+app.config['LOG_FORMAT'] = 'text'  # or 'json' for one structured object per line
+app.config['LOG_QUEUE'] = True  # write log records from a background thread
+app.config.from_envvar('FINANCE_SETTINGS', silent=True)
+
 # Setup logging
-logging.basicConfig(level=logging.DEBUG)
+log_setup.configure_logging(
+    level=app.config['LOG_LEVEL'],
+    levels=app.config['LOG_LEVELS'],
+    payload_sample_rate=app.config['LOG_PAYLOAD_SAMPLE_RATE'],
+    fmt=app.config['LOG_FORMAT'],
+    use_queue=app.config['LOG_QUEUE'],
+)
 logger = logging.getLogger(__name__)
+# Request/response bodies; DEBUG records here are sampled
+payload_logger = logging.getLogger(f"{__name__}.payload")
 
 # Flask-Login setup
 login_manager = LoginManager()
@@ -24,15 +78,79 @@ login_manager.login_view = 'login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return database.get_user_by_id(user_id)
+    return database.get_cached_user(user_id)
 
+database.configure(
+    path=app.config['DATABASE'],
+    pool_size=app.config['DATABASE_POOL_SIZE'],
+    statement_cache_size=app.config['DATABASE_STATEMENT_CACHE_SIZE'],
+    busy_timeout=app.config['DATABASE_BUSY_TIMEOUT'],
+    pragmas=app.config['DATABASE_PRAGMAS'],
+    shared_versions=app.config['DATABASE_SHARED_VERSIONS'],
+)
 database.init_db()
+database.configure_user_cache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+ml_models.set_frame_cache_size(app.config['TRANSACTION_CACHE_SIZE'])
+ml_numpy.set_arrays_cache_size(app.config['TRANSACTION_CACHE_SIZE'])
+ml_models.configure_forecasting(app.config['FORECAST_WORKERS'], app.config['FORECAST_CACHE_SIZE'])
+if app.config['DATABASE_CHECK_QUERY_PLANS']:
+    database.check_query_plans()
+http_cache.configure(app.config['HTTP_CACHE_ENTRIES'], app.config['HTTP_CACHE_BYTES'], app.config['HTTP_CACHE_MAX_AGE'])
+compression.configure(app.config['COMPRESS_LEVEL'], app.config['COMPRESS_MIN_SIZE'])
+
+metrics.configure(app.config['METRICS_ENABLED'])
+if app.config['METRICS_ENABLED']:
+    metrics.instrument(database, 'db', exclude=('configure', 'get_connection', 'release_connection',
+                                                'close_all_connections'))
+    metrics.instrument(ml_models, 'ml')
+    metrics.instrument(ml_numpy, 'ml')
+    metrics.gauge('finance_http_cache_entries', 'Response bodies held by the HTTP cache.',
+                  lambda: http_cache.stats()['entries'])
+    metrics.gauge('finance_http_cache_bytes', 'Total size of the response bodies held by the HTTP cache.',
+                  lambda: http_cache.stats()['bytes'])
+
+@app.before_request
+def begin_request_metrics():
+    metrics.begin_request()
+
+@app.after_request
+def finish_request_metrics(response):
+    stats = metrics.finish_request(request.endpoint, request.method, response.status_code)
+    if stats is not None and app.config['METRICS_SERVER_TIMING']:
+        response.headers['Server-Timing'] = metrics.server_timing(stats)
+    return response
+
+@app.teardown_request
+def end_request_metrics(exc):
+    metrics.end_request(request.endpoint, request.method)
+
+@app.after_request
+def compress_response(response):
+    return compression.compress_response(response)
+
+recurring_scheduler = recurring.RecurringScheduler(app.config['RECURRING_INTERVAL'])
+
+@app.before_request
+def start_recurring_scheduler():
+    # Started by the first request so CLI commands and imports of app don't spawn it
+    if not recurring_scheduler.running:
+        recurring_scheduler.start()
 
 @app.route('/')
 @login_required
 def home():
     return render_template('index.html', user=current_user, now=datetime.datetime.now())
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Prometheus scrape endpoint. Not behind login (scrapers don't have a session);
+    it only exposes counts and timings, never user data.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'status': 'error', 'message': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
@@ -65,29 +183,43 @@ def logout():
     logout_user()
     return redirect(url_for('login'))
 
+def add_transactions_batch(items):
+    """
+    /add_transaction with a JSON array body: validates every item first, then
+    writes them all (and any Savings goal contributions) in one transaction.
+    """
+    required_fields = ['type', 'category', 'amount', 'date']
+    rows = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not all(field in item for field in required_fields):
+            logger.error(f"Missing required fields in transaction {i}")
+            return jsonify({'status': 'error', 'message': f"Missing required fields in transaction {i}"}), 400
+        try:
+            amount = float(item['amount'])
+        except (TypeError, ValueError):
+            logger.error(f"Invalid amount in transaction {i}: {item['amount']}")
+            return jsonify({'status': 'error', 'message': f"Invalid amount in transaction {i}"}), 400
+        rows.append([item['type'], item['category'], amount, item['date']])
+    if database.add_transactions_with_goals(current_user.id, rows) is not None:
+        return jsonify({'status': 'success', 'added': len(rows)})
+    return jsonify({'status': 'error', 'message': 'Failed to add transactions'}), 500
+
 @app.route('/add_transaction', methods=['POST'])
 @login_required
 def add_trans():
     try:
         data = request.json
-        logger.debug(f"Received transaction data: {data}")
+        payload_logger.debug("Received transaction data: %s", data)
+        if isinstance(data, list):
+            return add_transactions_batch(data)
         required_fields = ['type', 'category', 'amount', 'date']
         if not all(field in data for field in required_fields):
             logger.error("Missing required fields in transaction data")
             return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
         
-        goal_id_to_contribute = 0
-        if data['type'] == 'income' and data['category'] == 'Savings':
-            goals = database.get_goals(current_user.id)
-            now = datetime.date.today()
-            upcoming_goals = [g for g in goals if g['deadline'] and datetime.datetime.strptime(g['deadline'], '%Y-%m-%d').date() > now and g['current_amount'] < g['target_amount']]
-            if upcoming_goals:
-                upcoming_goals.sort(key=lambda x: x['deadline'])
-                goal_id_to_contribute = upcoming_goals[0]['id']
-        
-        if database.add_transaction(current_user.id, data['type'], data['category'], data['amount'], data['date'], goal_id_to_contribute):
-            if goal_id_to_contribute > 0:
-                database.update_goal_progress(current_user.id, goal_id_to_contribute, data['amount'])
+        # Picks the goal, inserts and funds it in one transaction
+        row = (data['type'], data['category'], data['amount'], data['date'])
+        if database.add_transactions_with_goals(current_user.id, [row]) is not None:
             flash('Transaction added successfully!')
             return jsonify({'status': 'success'})
         else:
@@ -98,12 +230,52 @@ def add_trans():
         flash('An unexpected error occurred.')
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/import_transactions', methods=['POST'])
+@login_required
+def import_trans():
+    """
+    Bulk import of a CSV or OFX statement uploaded as the `file` form field.
+    The format comes from `format` or the file extension.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload is None:
+            logger.error("No file provided for import")
+            return jsonify({'status': 'error', 'message': 'No file provided'}), 400
+        fmt = request.form.get('format') or importer.detect_format(upload.filename)
+        if fmt not in ('csv', 'ofx'):
+            return jsonify({'status': 'error', 'message': f"Unsupported format {fmt}"}), 400
+        try:
+            stats = importer.import_transactions(current_user.id, importer.open_text(upload.stream), fmt,
+                                                 chunk_size=app.config['IMPORT_CHUNK_SIZE'],
+                                                 max_rows=app.config['IMPORT_MAX_ROWS'])
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.error(f"Invalid import file: {str(e)}")
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        return jsonify(stats), 200 if stats['status'] == 'success' else 500
+    except Exception as e:
+        logger.error(f"Error importing transactions: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/delete_transaction', methods=['POST'])
 @login_required
 def delete_trans():
     try:
         data = request.json
-        logger.debug(f"Received delete transaction data: {data}")
+        payload_logger.debug("Received delete transaction data: %s", data)
+        if isinstance(data, list):
+            # Batch form: a JSON array of ids (or of {'id': ...} objects), deleted in one transaction
+            try:
+                ids = [int(item['id'] if isinstance(item, dict) else item) for item in data]
+            except (KeyError, TypeError, ValueError):
+                logger.error("Invalid transaction ID in batch delete")
+                return jsonify({'status': 'error', 'message': 'Invalid transaction ID'}), 400
+            deleted = database.delete_transactions(current_user.id, ids)
+            if deleted is None:
+                return jsonify({'status': 'error', 'message': 'Failed to delete transactions'}), 500
+            deleted_ids = set(deleted)
+            return jsonify({'status': 'success', 'deleted': deleted,
+                            'not_found': [i for i in dict.fromkeys(ids) if i not in deleted_ids]})
         if 'id' not in data:
             logger.error("Missing transaction ID")
             return jsonify({'status': 'error', 'message': 'Missing transaction ID'}), 400
@@ -123,7 +295,7 @@ def delete_trans():
 def add_category():
     try:
         data = request.json
-        logger.debug(f"Received category data: {data}")
+        payload_logger.debug("Received category data: %s", data)
         if 'category' not in data or not data['category'].strip():
             logger.error("Missing or empty category name")
             return jsonify({'status': 'error', 'message': 'Category name is required'}), 400
@@ -140,72 +312,189 @@ def add_category():
 
 @app.route('/get_categories')
 @login_required
+@http_cache.cached_response
 def get_categories():
     try:
         categories = database.get_categories(current_user.id)
-        logger.debug(f"Fetched {len(categories)} categories for user {current_user.id}")
+        logger.debug("Fetched %d categories for user %s", len(categories), current_user.id)
         return jsonify({'categories': categories})
     except Exception as e:
         logger.error(f"Error fetching categories: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+TRANSACTION_FIELDS = ('id', 'type', 'category', 'amount', 'date', 'goal_id')
+
+def transaction_json(t):
+    return {field: t[field] for field in TRANSACTION_FIELDS}
+
+# Fields sent as indexes into a list of their distinct values in format=columns
+DICTIONARY_FIELDS = ('type', 'category')
+
+def response_format():
+    """The ?format= of a request: 'rows' (default) or 'columns'; ValueError otherwise."""
+    value = request.args.get('format') or 'rows'
+    if value not in ('rows', 'columns'):
+        raise ValueError(f"Invalid format: {value!r}")
+    return value
+
+def transaction_columns_json(columns):
+    """
+    The format=columns shape of a transaction list, from {field: [values]}: one
+    array per TRANSACTION_FIELDS field under 'columns', with type and category as
+    indexes into 'dictionaries'. static/js/utils.js decodeColumns() reverses it.
+    """
+    out = {'format': 'columns', 'length': len(columns['id']), 'columns': {}, 'dictionaries': {}}
+    for field in TRANSACTION_FIELDS:
+        values = columns[field]
+        if field in DICTIONARY_FIELDS:
+            index = {}
+            values = [index.setdefault(v, len(index)) for v in values]
+            out['dictionaries'][field] = list(index)
+        out['columns'][field] = values
+    return out
+
+def series_json(mapping, fmt):
+    """A {label: value} series as is, or as {'labels': [...], 'data': [...]} for format=columns."""
+    if fmt == 'columns':
+        return {'labels': list(mapping), 'data': list(mapping.values())}
+    return mapping
+
+def transaction_json_rows(columns):
+    """transaction_json() dicts from get_transactions(columns=True), made one at a time."""
+    return (dict(zip(TRANSACTION_FIELDS, values)) for values in zip(*(columns[f] for f in TRANSACTION_FIELDS)))
+
+def encode_transactions(rows, batch_size):
+    """
+    transaction_json() dicts as a JSON array, in one piece per batch_size rows;
+    only a batch of dicts exists at a time, and each batch is one encoder call.
+    """
+    yield '['
+    batch = []
+    first = True
+    for t in rows:
+        batch.append(t)
+        if len(batch) >= batch_size:
+            yield ('' if first else ',') + app.json.dumps(batch, separators=(',', ':'))[1:-1]
+            first = False
+            batch = []
+    if batch:
+        yield ('' if first else ',') + app.json.dumps(batch, separators=(',', ':'))[1:-1]
+    yield ']'
+
+def stream_transactions(rows, batch_size):
+    """Writes rows as a JSON array, one chunk per batch_size rows."""
+    try:
+        yield from encode_transactions((transaction_json(t) for t in rows), batch_size)
+    except Exception as e:
+        # Headers are already sent; the truncated array is the only signal the client gets
+        logger.error(f"Error streaming transactions: {str(e)}")
+
 @app.route('/get_transactions')
 @login_required
 def get_trans():
+    """
+    The user's transactions ordered by (date, id). Without paging parameters
+    returns the full list. `limit` (and optionally `after`, the previous page's
+    next_cursor) returns {'transactions', 'next_cursor'} instead; `stream=1`
+    writes the full list incrementally without buffering it. `format=columns`
+    sends the list (or page) as transaction_columns_json().
+    """
     try:
         start_date = request.args.get('start_date') or None
         end_date = request.args.get('end_date') or None
         category = request.args.get('category') or None
+        after = request.args.get('after') or None
+        limit = request.args.get('limit') or None
+        stream = request.args.get('stream') in ('1', 'true')
+        try:
+            fmt = response_format()
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
 
-        logger.debug(f"Fetching transactions with start_date={start_date}, end_date={end_date}, category={category}")
+        logger.debug("Fetching transactions with start_date=%s, end_date=%s, category=%s, after=%s, limit=%s, stream=%s",
+                     start_date, end_date, category, after, limit, stream)
 
-        trans = database.get_transactions(current_user.id, start_date, end_date, category)
+        if after:
+            try:
+                database.parse_transactions_cursor(after)
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
 
-        logger.debug(f"Fetched {len(trans)} transactions for user {current_user.id}")
-        
-        return jsonify([
-            {
-                'id': t['id'],
-                'type': t['type'],
-                'category': t['category'],
-                'amount': t['amount'],
-                'date': t['date'],
-                'goal_id': t['goal_id']
-            } for t in trans
-        ])
+        if stream:
+            if fmt == 'columns':
+                return jsonify({'status': 'error', 'message': 'format=columns is not available with stream=1'}), 400
+            rows = database.iter_transactions(current_user.id, start_date, end_date, category, after=after,
+                                              batch_size=app.config['TRANSACTIONS_STREAM_BATCH'])
+            return Response(stream_transactions(rows, app.config['TRANSACTIONS_STREAM_BATCH']),
+                            mimetype='application/json')
+
+        if limit or after:
+            try:
+                limit = int(limit or app.config['TRANSACTIONS_PAGE_MAX'])
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'Invalid limit'}), 400
+            if not 1 <= limit <= app.config['TRANSACTIONS_PAGE_MAX']:
+                return jsonify({'status': 'error',
+                                'message': f"limit must be between 1 and {app.config['TRANSACTIONS_PAGE_MAX']}"}), 400
+            trans, next_cursor = database.get_transactions_page(current_user.id, start_date, end_date, category,
+                                                                after=after, limit=limit)
+            logger.debug("Fetched page of %d transactions for user %s", len(trans), current_user.id)
+            if fmt == 'columns':
+                page = transaction_columns_json({field: [t[field] for t in trans] for field in TRANSACTION_FIELDS})
+            else:
+                page = [transaction_json(t) for t in trans]
+            return jsonify({'transactions': page, 'next_cursor': next_cursor})
+
+        trans = database.get_transactions(current_user.id, start_date, end_date, category, columns=True)
+
+        logger.debug("Fetched %d transactions for user %s", len(trans['id']), current_user.id)
+
+        if fmt == 'columns':
+            return jsonify(transaction_columns_json(trans))
+        body = ''.join(encode_transactions(transaction_json_rows(trans), app.config['TRANSACTIONS_STREAM_BATCH']))
+        return Response(body, mimetype='application/json')
     except Exception as e:
         logger.error(f"Error fetching transactions: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+VISUALIZE_FREQS = {'daily': 'D', 'weekly': 'W', 'monthly': 'ME'}
+
+def filter_by_date(df, start_date=None, end_date=None):
+    """Restricts a prepared transactions frame to [start_date, end_date] (inclusive)."""
+    if start_date:
+        df = df[df['date'] >= pd.Timestamp(start_date)]
+    if end_date:
+        df = df[df['date'] <= pd.Timestamp(end_date)]
+    return df
+
+def visualization_data(df, period, fmt='rows'):
+    """Expense pie and amount trend for /visualize/<period>, each a series_json()."""
+    # This is the corrected line to filter for expenses
+    pie_data = df[df['type'] == 'expense'].groupby('category', observed=True)['amount'].sum().to_dict()
+    trend_series = df.groupby(pd.Grouper(key='date', freq=VISUALIZE_FREQS[period]))['amount'].sum()
+    trend_data = {str(date): amount for date, amount in trend_series.to_dict().items()}
+    payload_logger.debug("Pie data: %s, Trend data: %s", pie_data, trend_data)
+    return {'pie': series_json(pie_data, fmt), 'trend': series_json(trend_data, fmt)}
+
 @app.route('/visualize/<period>')
 @login_required
+@http_cache.cached_response
 def visualize(period):
     try:
         start_date = request.args.get('start_date') or None
         end_date = request.args.get('end_date') or None
-        logger.debug(f"Visualize: period={period}, start_date={start_date}, end_date={end_date}")
-        trans = database.get_transactions(current_user.id, start_date, end_date)
-        logger.debug(f"Visualize: Fetched {len(trans)} transactions")
-        df = ml_models.prepare_data(trans)
-        
+        logger.debug("Visualize: period=%s, start_date=%s, end_date=%s", period, start_date, end_date)
         try:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            if df['date'].isna().any():
-                logger.warning("Some transaction dates could not be parsed and will be excluded")
-                df = df.dropna(subset=['date'])
-        except Exception as e:
-            logger.error(f"Error converting dates to datetime: {str(e)}")
-            return jsonify({'status': 'error', 'message': f"Date conversion error: {str(e)}"}), 500
-
-        if period in ['daily', 'weekly', 'monthly']:
-            group_freq = {'daily': 'D', 'weekly': 'W', 'monthly': 'ME'}[period]
-            # This is the corrected line to filter for expenses
-            pie_data = df[df['type'] == 'expense'].groupby('category')['amount'].sum().to_dict()
-            trend_series = df.groupby(pd.Grouper(key='date', freq=group_freq))['amount'].sum()
-            trend_data = {str(date): amount for date, amount in trend_series.to_dict().items()}
-            logger.debug(f"Pie data: {pie_data}, Trend data: {trend_data}")
-            return jsonify({'pie': pie_data, 'trend': trend_data})
+            fmt = response_format()
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        # Daily rollup rows are enough for both the pie and every trend granularity
+        df = rollup_frame(database.get_daily_totals(current_user.id, start_date, end_date))
+        logger.debug("Visualize: %d daily rollup rows in range", len(df))
+
+        if period in VISUALIZE_FREQS:
+            return jsonify(visualization_data(df, period, fmt))
         logger.error(f"Invalid period: {period}")
         return jsonify({'status': 'error', 'message': 'Invalid period'}), 400
     except Exception as e:
@@ -217,7 +506,7 @@ def visualize(period):
 def add_goal():
     try:
         data = request.json
-        logger.debug(f"Received goal data: {data}")
+        payload_logger.debug("Received goal data: %s", data)
         required_fields = ['goal_name', 'target_amount', 'deadline']
         if not all(field in data for field in required_fields):
             logger.error("Missing required fields in goal data")
@@ -232,6 +521,7 @@ def add_goal():
 
 @app.route('/get_goals')
 @login_required
+@http_cache.cached_response
 def get_goals():
     try:
         goals = database.get_goals(current_user.id)
@@ -245,7 +535,7 @@ def get_goals():
 def update_goal_progress():
     try:
         data = request.json
-        logger.debug(f"Received goal progress data: {data}")
+        payload_logger.debug("Received goal progress data: %s", data)
         if 'id' not in data or 'current_amount' not in data:
             logger.error("Missing required fields in goal progress data")
             return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
@@ -287,37 +577,42 @@ def update_goal_route():
         logger.error(f"Error updating goal: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def analytics_engine(user_id):
+    """(module, data) for the configured ANALYTICS_ENGINE: ml_models with a DataFrame or ml_numpy with TransactionArrays."""
+    if app.config['ANALYTICS_ENGINE'] == 'numpy':
+        return ml_numpy, ml_numpy.get_transaction_arrays(user_id)
+    return ml_models, ml_models.get_transactions_df(user_id)
+
 @app.route('/analyze')
 @login_required
 def analyze():
     try:
-        trans = database.get_transactions(current_user.id)
-        df = ml_models.prepare_data(trans)
-        overspend = ml_models.detect_overspending(df)
-        logger.debug(f"Analyze: {overspend}")
+        overspend = ml_models.get_overspending(current_user.id)
+        payload_logger.debug("Analyze: %s", overspend)
         return jsonify(overspend)
     except Exception as e:
         logger.error(f"Error in analyze endpoint: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def rollup_frame(rows):
+    """Daily rollup rows as a frame with the date/type/category/amount columns visualization_data expects."""
+    df = pd.DataFrame(rows, columns=['day', 'type', 'category', 'total', 'count'])
+    df = df.rename(columns={'day': 'date', 'total': 'amount'})
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    return df.dropna(subset=['date'])
+
 @app.route('/monthly_spending')
 @login_required
 def monthly_spending():
     try:
         start_of_month = datetime.date.today().replace(day=1).strftime('%Y-%m-%d')
         today = datetime.date.today().strftime('%Y-%m-%d')
-        trans = database.get_transactions(current_user.id, start_date=start_of_month, end_date=today)
-        df = ml_models.prepare_data(trans)
-        total_spending = df[df['type'] == 'expense']['amount'].sum() if not df.empty else 0
-        return jsonify({'total_spending': float(total_spending)})
+        totals = database.get_totals_by_type(current_user.id, start_date=start_of_month, end_date=today)
+        return jsonify({'total_spending': float(totals.get('expense') or 0)})
     except Exception as e:
         logger.error(f"Error in monthly_spending endpoint: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-# app.py
-
-# ... (all existing imports and routes) ...
-
 @app.route('/monthly_summary')
 @login_required
 def monthly_summary():
@@ -331,17 +626,15 @@ def monthly_summary():
             start_date_str = today.replace(day=1).strftime('%Y-%m-%d')
             end_date_str = today.strftime('%Y-%m-%d')
 
-        trans = database.get_transactions(current_user.id, start_date=start_date_str, end_date=end_date_str)
-        df = ml_models.prepare_data(trans)
-
-        total_income = df[df['type'] == 'income']['amount'].sum() if 'income' in df['type'].unique() else 0
-        total_expenses = df[df['type'] == 'expense']['amount'].sum() if 'expense' in df['type'].unique() else 0
+        totals = database.get_totals_by_type(current_user.id, start_date=start_date_str, end_date=end_date_str)
+        total_income = float(totals.get('income') or 0)
+        total_expenses = float(totals.get('expense') or 0)
         balance = total_income - total_expenses
         
         return jsonify({
-            'total_income': float(total_income),
-            'total_expenses': float(total_expenses),
-            'balance': float(balance)
+            'total_income': total_income,
+            'total_expenses': total_expenses,
+            'balance': balance
         })
     except Exception as e:
         logger.error(f"Error in monthly_summary endpoint: {str(e)}")
@@ -354,58 +647,46 @@ def monthly_comparison():
     try:
         today = datetime.date.today()
         
-        # Current month
         current_month_start = today.replace(day=1)
-        current_month_end = today
-        current_trans = database.get_transactions(current_user.id, current_month_start.strftime('%Y-%m-%d'), current_month_end.strftime('%Y-%m-%d'))
-        current_df = ml_models.prepare_data(current_trans)
-        current_expenses_by_cat = current_df[current_df['type'] == 'expense'].groupby('category')['amount'].sum().to_dict()
-        current_month_exp = current_df[current_df['type'] == 'expense']['amount'].sum()
-
-        # Previous month
         prev_month_end = current_month_start - datetime.timedelta(days=1)
         prev_month_start = prev_month_end.replace(day=1)
-        prev_trans = database.get_transactions(current_user.id, prev_month_start.strftime('%Y-%m-%d'), prev_month_end.strftime('%Y-%m-%d'))
-        prev_df = ml_models.prepare_data(prev_trans)
-        prev_expenses_by_cat = prev_df[prev_df['type'] == 'expense'].groupby('category')['amount'].sum().to_dict()
-        prev_month_exp = prev_df[prev_df['type'] == 'expense']['amount'].sum()
+        # Both months in one GROUP BY over the daily rollup
+        periods = database.compare_periods(current_user.id, {
+            'current_month': (current_month_start.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')),
+            'previous_month': (prev_month_start.strftime('%Y-%m-%d'), prev_month_end.strftime('%Y-%m-%d')),
+        })
 
         return jsonify({
-            'current_month': {
-                'total_expenses': float(current_month_exp) if not pd.isna(current_month_exp) else 0,
-                'breakdown': {k: float(v) for k, v in current_expenses_by_cat.items()}
-            },
-            'previous_month': {
-                'total_expenses': float(prev_month_exp) if not pd.isna(prev_month_exp) else 0,
-                'breakdown': {k: float(v) for k, v in prev_expenses_by_cat.items()}
-            }
+            label: {
+                'total_expenses': float(p['total']),
+                'breakdown': {k: float(v) for k, v in p['breakdown'].items()}
+            } for label, p in periods.items()
         })
     except Exception as e:
         logger.error(f"Error in monthly_comparison endpoint: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
     
+def budget_with_spending(df):
+    """recommend_budget() plus this month's spending per budgeted category."""
+    rec = ml_models.recommend_budget(df)
+    today = datetime.date.today()
+    current_df = filter_by_date(df, today.replace(day=1), today)
+    spending = current_df[current_df['type'] == 'expense'].groupby('category', observed=True)['amount'].sum().to_dict()
+    spending = {k: float(v) for k, v in spending.items()}
+    for cat in rec.get('budgets', {}):
+        if cat not in spending:
+            spending[cat] = 0.0
+    rec['spending'] = spending
+    return rec
+
 @app.route('/budget')
 @login_required
+@http_cache.cached_response
 def budget():
     try:
-        trans = database.get_transactions(current_user.id)
-        df = ml_models.prepare_data(trans)
-        rec = ml_models.recommend_budget(df)
-        today = datetime.date.today()
-        start_of_month = today.replace(day=1)
-        current_trans = database.get_transactions(
-            current_user.id,
-            start_date=start_of_month.strftime('%Y-%m-%d'),
-            end_date=today.strftime('%Y-%m-%d')
-        )
-        current_df = ml_models.prepare_data(current_trans)
-        spending = current_df[current_df['type'] == 'expense'].groupby('category')['amount'].sum().to_dict()
-        spending = {k: float(v) for k, v in spending.items()}
-        for cat in rec.get('budgets', {}):
-            if cat not in spending:
-                spending[cat] = 0.0
-        rec['spending'] = spending
-        logger.debug(f"Budget: {rec}")
+        df = ml_models.get_transactions_df(current_user.id)
+        rec = budget_with_spending(df)
+        payload_logger.debug("Budget: %s", rec)
         return jsonify(rec)
     except Exception as e:
         logger.error(f"Error in budget endpoint: {str(e)}")
@@ -416,16 +697,24 @@ def budget():
 def update_budget():
     try:
         data = request.json
-        logger.debug(f"Received budget update data: {data}")
-        budgets = data.get('budgets', {})
+        payload_logger.debug("Received budget update data: %s", data)
+        # {'budgets': {category: amount}} or a JSON array of {'category', 'amount'[, 'alert_enabled']}
+        if isinstance(data, list):
+            if not all(isinstance(b, dict) and 'category' in b and 'amount' in b for b in data):
+                logger.error("Budget entries need category and amount")
+                return jsonify({'status': 'error', 'message': 'Budget entries need category and amount'}), 400
+            budgets = [(b['category'], b['amount'], bool(b.get('alert_enabled', False))) for b in data]
+        else:
+            budgets = [(category, amount, False) for category, amount in data.get('budgets', {}).items()]
         if not budgets:
             logger.error("No budget data provided")
             return jsonify({'status': 'error', 'message': 'No budget data provided'}), 400
-        for category, amount in budgets.items():
+        for category, amount, _ in budgets:
             if not isinstance(amount, (int, float)) or amount < 0:
                 logger.error(f"Invalid budget amount for {category}: {amount}")
                 return jsonify({'status': 'error', 'message': f"Invalid budget amount for {category}"}), 400
-            database.update_budget(current_user.id, category, float(amount))
+        if not database.update_budgets(current_user.id, [(category, float(amount), alert) for category, amount, alert in budgets]):
+            return jsonify({'status': 'error', 'message': 'Failed to update budgets'}), 500
         logger.info(f"Budgets updated for user {current_user.id}")
         return jsonify({'status': 'success'})
     except Exception as e:
@@ -436,10 +725,9 @@ def update_budget():
 @login_required
 def investments():
     try:
-        trans = database.get_transactions(current_user.id)
-        df = ml_models.prepare_data(trans)
-        suggestions = ml_models.investment_suggestions(df)
-        logger.debug(f"Investments: {suggestions}")
+        engine, data = analytics_engine(current_user.id)
+        suggestions = engine.investment_suggestions(data)
+        payload_logger.debug("Investments: %s", suggestions)
         return jsonify({'suggestions': suggestions})
     except Exception as e:
         logger.error(f"Error in investments endpoint: {str(e)}")
@@ -449,10 +737,9 @@ def investments():
 @login_required
 def offers():
     try:
-        trans = database.get_transactions(current_user.id)
-        df = ml_models.prepare_data(trans)
-        offers = ml_models.get_offers(df)
-        logger.debug(f"Offers: {offers}")
+        engine, data = analytics_engine(current_user.id)
+        offers = engine.get_offers(data)
+        payload_logger.debug("Offers: %s", offers)
         return jsonify({'offers': offers})
     except Exception as e:
         logger.error(f"Error in offers endpoint: {str(e)}")
@@ -462,10 +749,8 @@ def offers():
 @login_required
 def forecast():
     try:
-        trans = database.get_transactions(current_user.id)
-        df = ml_models.prepare_data(trans)
-        forecast = ml_models.forecast_expenses(df)
-        logger.debug(f"Forecast: {forecast}")
+        forecast = ml_models.get_cached_forecast(current_user.id)
+        payload_logger.debug("Forecast: %s", forecast)
         return jsonify(forecast)
     except Exception as e:
         logger.error(f"Error in forecast endpoint: {str(e)}")
@@ -483,14 +768,8 @@ def today_spending():
         today = datetime.date.today().strftime('%Y-%m-%d')
         transactions_data = database.get_transactions(current_user.id, start_date=today, end_date=today)
         
-        daily_breakdown = {}
-        for t in transactions_data:
-            if t['type'] == 'expense': # Use dictionary key 'type' instead of tuple index 2
-                category = t['category'] # Use dictionary key 'category' instead of tuple index 3
-                amount = t['amount'] # Use dictionary key 'amount' instead of tuple index 4
-                daily_breakdown[category] = daily_breakdown.get(category, 0) + amount
-        
-        # FIX: Ensure all values are standard floats for JSON serialization
+        # Breakdown is aggregated in SQL from the daily rollup; floats for JSON serialization
+        daily_breakdown = database.get_totals_by_category(current_user.id, today, today)
         daily_breakdown = {k: float(v) for k, v in daily_breakdown.items()}
 
         total_daily_spending = sum(daily_breakdown.values())
@@ -514,21 +793,111 @@ def get_budget_alerts_route():
     API endpoint to get budget alerts.
     """
     try:
-        trans = database.get_transactions(current_user.id)
-        df = ml_models.prepare_data(trans)
+        engine, data = analytics_engine(current_user.id)
         
-        recommended_budgets = ml_models.recommend_budget(df)
+        recommended_budgets = engine.recommend_budget(data)
         
-        alerts = ml_models.get_budget_alerts(df, recommended_budgets)
+        alerts = engine.get_budget_alerts(data, recommended_budgets)
         
-        logger.debug(f"Budget Alerts: {alerts}")
+        payload_logger.debug("Budget alerts: %s", alerts)
         return jsonify(alerts)
     except Exception as e:
         logger.error(f"Error in budget_alerts endpoint: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def transaction_records(df, fmt='rows'):
+    """Row dicts in the /get_transactions JSON shape (or its format=columns shape) from a prepared frame."""
+    out = df[list(TRANSACTION_FIELDS)].copy()
+    out['date'] = out['date'].dt.strftime('%Y-%m-%d')
+    if fmt == 'columns':
+        return transaction_columns_json({field: out[field].tolist() for field in TRANSACTION_FIELDS})
+    return out.to_dict('records')
+
+@app.route('/dashboard')
+@login_required
+@http_cache.cached_response
+def dashboard():
+    """
+    Everything the dashboard shows in one response. The user's transactions are
+    loaded once and every widget is computed from that shared frame; each key holds
+    what the corresponding standalone route would return (or an error object),
+    with `format=columns` applied to transactions and visualize.
+    """
+    start_date = request.args.get('start_date') or None
+    end_date = request.args.get('end_date') or None
+    period = request.args.get('period') or 'monthly'
+    try:
+        fmt = response_format()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    user_id = current_user.id
+    payload = {}
+
+    def widget(name, compute):
+        try:
+            payload[name] = compute()
+        except Exception as e:
+            logger.error(f"Error computing dashboard widget {name}: {str(e)}")
+            payload[name] = {'status': 'error', 'message': str(e)}
+
+    try:
+        df = ml_models.get_transactions_df(user_id)
+        today = datetime.date.today()
+        month_df = filter_by_date(df, today.replace(day=1), today)
+        if start_date and end_date:
+            range_df = filter_by_date(df, start_date, end_date)
+        else:
+            range_df = month_df
+        shared = {}
+
+        def summary():
+            total_income = float(range_df.loc[range_df['type'] == 'income', 'amount'].sum())
+            total_expenses = float(range_df.loc[range_df['type'] == 'expense', 'amount'].sum())
+            return {'total_income': total_income, 'total_expenses': total_expenses,
+                    'balance': total_income - total_expenses}
+
+        def net_worth():
+            assets = database.get_assets(user_id)
+            debts = database.get_debts(user_id)
+            return {'net_worth': ml_models.calculate_net_worth(assets, debts), 'assets': assets, 'debts': debts}
+
+        def budget_widget():
+            shared['budget'] = budget_with_spending(df)
+            return shared['budget']
+
+        def visualize_widget():
+            if period not in VISUALIZE_FREQS:
+                return {'status': 'error', 'message': 'Invalid period'}
+            return visualization_data(filter_by_date(df, start_date, end_date), period, fmt)
+
+        widget('transactions', lambda: transaction_records(filter_by_date(df, start_date, end_date), fmt))
+        widget('visualize', visualize_widget)
+        widget('monthly_summary', summary)
+        widget('monthly_spending', lambda: {
+            'total_spending': float(month_df.loc[month_df['type'] == 'expense', 'amount'].sum())})
+        widget('goals', lambda: {'goals': database.get_goals(user_id)})
+        widget('net_worth', net_worth)
+        widget('recurring_transactions', lambda: {
+            'recurring_transactions': database.get_recurring_transactions(user_id)})
+        widget('analyze', lambda: ml_models.get_overspending(user_id))
+        widget('budget', budget_widget)
+        # Reuse the recommendation computed for the budget widget
+        widget('budget_alerts', lambda: ml_models.get_budget_alerts(df, shared.get('budget') or ml_models.recommend_budget(df)))
+        widget('investments', lambda: {'suggestions': ml_models.investment_suggestions(df)})
+        widget('offers', lambda: {'offers': ml_models.get_offers(df)})
+        widget('forecast', lambda: ml_models.get_cached_forecast(user_id, df))
+        response = jsonify(payload)
+        if payload['forecast'].get('refreshing') or payload['forecast'].get('status') == 'error':
+            # The forecast changes without a data write once the background fit lands
+            response.cache_control.no_store = True
+        return response
+    except Exception as e:
+        logger.error(f"Error in dashboard endpoint: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/net_worth')
 @login_required
+@http_cache.cached_response
 def get_net_worth():
     try:
         assets = database.get_assets(current_user.id)
@@ -618,6 +987,7 @@ def add_recurring_route():
 
 @app.route('/recurring_transactions', methods=['GET'])
 @login_required
+@http_cache.cached_response
 def get_recurring_transactions_route():
     try:
         recurring_trans = database.get_recurring_transactions(current_user.id)
@@ -640,6 +1010,7 @@ def delete_recurring_transaction_route(trans_id):
 
 @app.route('/assets', methods=['GET'])
 @login_required
+@http_cache.cached_response
 def get_assets_route():
     try:
         assets = database.get_assets(current_user.id)
@@ -676,5 +1047,67 @@ def recurring_viz_data():
         logger.error(f"Error fetching recurring visualization data: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
     
+@app.cli.command('rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user (default: everyone).')
+def rebuild_rollups_command(user_id):
+    """Backfill daily/monthly rollup tables from transactions."""
+    if not database.rebuild_rollups(user_id):
+        raise click.ClickException('Rollup rebuild failed, see log for details')
+    click.echo('Rollups rebuilt.')
+
+@app.cli.command('forecast-all')
+@click.option('--workers', type=int, default=None, help='ARIMA fit processes (default: FORECAST_WORKERS).')
+@click.option('--fast', is_flag=True, help='Exponential smoothing for everyone, no ARIMA.')
+def forecast_all_command(workers, fast):
+    """Batch-forecast next month's expenses for all users into the forecasts table."""
+    stats = ml_models.batch_forecast(workers=workers, fast=fast)
+    click.echo(f"Forecast {stats['users']} users ({stats['arima']} ARIMA, {stats['exp_smoothing']} smoothing) "
+               f"in {stats['seconds']}s: {stats['users_per_sec']} users/sec")
+
+@app.cli.command('import-transactions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user-id', type=int, required=True, help='User the transactions belong to.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ofx']), default=None, help='Default: from the file extension.')
+@click.option('--chunk-size', type=int, default=None, help='Rows per insert batch (default: IMPORT_CHUNK_SIZE).')
+def import_transactions_command(path, user_id, fmt, chunk_size):
+    """Bulk import a CSV or OFX statement for a user."""
+    if database.get_user_by_id(user_id) is None:
+        raise click.ClickException(f"No user with id {user_id}")
+    with open(path, 'rb') as f:
+        try:
+            stats = importer.import_transactions(user_id, importer.open_text(f), fmt or importer.detect_format(path),
+                                                 chunk_size=chunk_size or app.config['IMPORT_CHUNK_SIZE'],
+                                                 max_rows=app.config['IMPORT_MAX_ROWS'])
+        except (ValueError, UnicodeDecodeError) as e:
+            raise click.ClickException(str(e))
+    for error in stats['errors']:
+        click.echo(f"line {error['line']}: {error['message']}", err=True)
+    click.echo(f"Imported {stats['imported']} transactions ({stats['skipped']} skipped) "
+               f"in {stats['seconds']}s: {stats['rows_per_sec']} rows/sec")
+    if stats['status'] != 'success':
+        raise click.ClickException(stats['message'])
+
+@app.cli.command('materialize-recurring')
+@click.option('--date', 'today', default=None, help='Materialize occurrences up to this YYYY-MM-DD (default: today).')
+def materialize_recurring_command(today):
+    """Write all due recurring transactions (for cron or a separate worker process)."""
+    stats = recurring.materialize_due(today)
+    click.echo(f"Materialized {stats['transactions']} transactions from {stats['rules']} due rules")
+
+@app.cli.command('import-times')
+@click.option('--budget-ms', type=float, default=None, help='Fail if importing app takes longer than this.')
+def import_times_command(budget_ms):
+    """Report per-module import cost of app, and what the lazily loaded libraries cost on first use."""
+    total, direct, deferred = measure_import_times('app', ('pandas', 'numpy', 'statsmodels.tsa.arima.model'),
+                                                   path=app.root_path)
+    click.echo(f"import app: {total / 1000:.1f} ms")
+    for name, us in direct:
+        click.echo(f"  {name:<40} {us / 1000:8.1f} ms")
+    click.echo("deferred until first use:")
+    for name, us in deferred:
+        click.echo(f"  {name:<40} {us / 1000:8.1f} ms")
+    if budget_ms is not None and total / 1000 > budget_ms:
+        raise click.ClickException(f"import app took {total / 1000:.1f} ms, over the {budget_ms} ms budget")
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
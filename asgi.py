@@ -0,0 +1,249 @@
+import asyncio
+import concurrent.futures
+import io
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+
+from app import app, recurring_scheduler
+import database
+import ml_models
+
+logger = logging.getLogger(__name__)
+
+# Asynchronous serving mode: an ASGI application around the same Flask app, so
+# routes, templates and JSON are exactly what app.run() serves.
+#
+#     uvicorn asgi:application --port 8000      (or: python asgi.py)
+#
+# The event loop only moves bytes. Each request runs the Flask app in a bounded
+# thread pool (ASYNC_DB_WORKERS, by default one per pooled database connection),
+# and GETs of the analytics routes in ASYNC_CPU_ROUTES go to a pool of worker
+# processes (ASYNC_CPU_WORKERS) so pandas/statsmodels work doesn't hold the
+# parent's GIL. Thousands of slow clients cost a coroutine each, not a thread.
+#
+# Worker processes have their own frame, forecast, HTTP response and user caches,
+# and their own /metrics counts. Data versions are always read from the database
+# here (DATABASE_SHARED_VERSIONS is forced on), so a write in one process
+# invalidates the caches in all of them. Forecasts are fitted in the background
+# as under app.run(), on FORECAST_WORKERS threads in each worker process, which
+# serves its last fit, the stored batch forecast or the monthly mean meanwhile.
+
+STREAM_END = object()
+
+_db_executor = None
+_cpu_executor = None
+_executor_lock = threading.Lock()
+
+def _start_executors():
+    global _db_executor, _cpu_executor
+    with _executor_lock:
+        if _db_executor is not None:
+            return
+        if not app.config['DATABASE_SHARED_VERSIONS']:
+            logger.warning("DATABASE_SHARED_VERSIONS is off; asgi.py serves from several processes and turns it on")
+            app.config['DATABASE_SHARED_VERSIONS'] = True
+        database.configure(shared_versions=True)
+        db_workers = app.config['ASYNC_DB_WORKERS'] or app.config['DATABASE_POOL_SIZE']
+        _db_executor = concurrent.futures.ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix='asgi-db')
+        if app.config['ASYNC_CPU_WORKERS'] > 0:
+            # spawn, not fork: the parent has threads (executors, log listener) by now
+            _cpu_executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=app.config['ASYNC_CPU_WORKERS'], mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_cpu_worker)
+        logger.info(f"ASGI executors started: {db_workers} threads, {app.config['ASYNC_CPU_WORKERS']} processes")
+
+def _stop_executors():
+    global _db_executor, _cpu_executor
+    with _executor_lock:
+        if _db_executor is not None:
+            _db_executor.shutdown(wait=True)
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=True, cancel_futures=True)
+        _db_executor = _cpu_executor = None
+    recurring_scheduler.stop(timeout=5)
+    ml_models.shutdown_forecasting()
+    database.close_all_connections()
+
+def _init_cpu_worker():
+    # The parent runs the recurring scheduler. Forecast fits stay in the
+    # background, so requests never wait on one
+    recurring_scheduler.interval = 0
+    database.configure(shared_versions=True)
+    # Fits run on background threads here: a process pool nested in a pool worker
+    # keeps it from exiting at shutdown (it joins its children before atexit runs)
+    ml_models.configure_forecasting(threads=True)
+
+def _environ(scope):
+    """WSGI environ for an ASGI http scope, without the body (so it can be pickled)."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def _call_app(environ, body):
+    """
+    Runs the Flask app: (status, headers, body chunks, rest). Responses with a
+    Content-Length are read in full and `rest` is None; for streamed ones the
+    first chunk is read and `rest` is the open iterator.
+    """
+    environ = dict(environ, **{'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr})
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]), headers]
+
+    result = app(environ, start_response)
+    try:
+        iterator = iter(result)
+        status, headers = started
+        if any(name.lower() == 'content-length' for name, _ in headers):
+            return status, headers, [chunk for chunk in iterator if chunk], None
+        chunk = next(iterator, STREAM_END)
+        if chunk is STREAM_END:
+            return status, headers, [], None
+    except BaseException:
+        if hasattr(result, 'close'):
+            result.close()
+        raise
+    return status, headers, [chunk], result
+
+def _call_app_buffered(environ, body):
+    # Process pool entry point: everything has to come back pickled in one piece
+    status, headers, chunks, rest = _call_app(environ, body)
+    if rest is not None:
+        try:
+            chunks += [chunk for chunk in rest if chunk]
+        finally:
+            if hasattr(rest, 'close'):
+                rest.close()
+    return status, headers, b''.join(chunks)
+
+def _next_chunk(result, iterator):
+    try:
+        return next(iterator)
+    except StopIteration:
+        if hasattr(result, 'close'):
+            result.close()
+        return STREAM_END
+    except BaseException:
+        if hasattr(result, 'close'):
+            result.close()
+        raise
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+def _runs_in_process(scope):
+    return (_cpu_executor is not None and scope['method'] in ('GET', 'HEAD')
+            and scope['path'] in app.config['ASYNC_CPU_ROUTES'])
+
+async def _http(scope, receive, send):
+    body = await _read_body(receive)
+    if body is None:
+        return
+    if _db_executor is None:
+        # Server without lifespan support
+        _start_executors()
+    loop = asyncio.get_running_loop()
+    environ = _environ(scope)
+    try:
+        if _runs_in_process(scope):
+            status, headers, content = await loop.run_in_executor(_cpu_executor, _call_app_buffered, environ, body)
+            chunks, rest = [content], None
+        else:
+            status, headers, chunks, rest = await loop.run_in_executor(_db_executor, _call_app, environ, body)
+    except Exception as e:
+        logger.error(f"Error serving {scope['method']} {scope['path']}: {str(e)}")
+        await send({'type': 'http.response.start', 'status': 500,
+                    'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': b'Internal Server Error'})
+        return
+
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]})
+    if rest is None:
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+        return
+    # Streamed response: pull each chunk in the thread pool, the app's generator
+    # may be waiting on the database
+    iterator = iter(rest)
+    try:
+        await send({'type': 'http.response.body', 'body': chunks[0], 'more_body': True})
+        while True:
+            chunk = await loop.run_in_executor(_db_executor, _next_chunk, rest, iterator)
+            if chunk is STREAM_END:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    except BaseException:
+        # Client went away mid-stream
+        if hasattr(rest, 'close'):
+            await loop.run_in_executor(_db_executor, rest.close)
+        raise
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                _start_executors()
+            except Exception as e:
+                logger.error(f"Error starting ASGI executors: {str(e)}")
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _stop_executors()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        await _http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    else:
+        raise NotImplementedError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("asgi.py needs uvicorn to serve on its own: pip install uvicorn (or use any ASGI server)")
+    uvicorn.run('asgi:application', host=os.environ.get('HOST', '127.0.0.1'), port=int(os.environ.get('PORT', 8000)),
+                lifespan='on')
@@ -0,0 +1,329 @@
+"""
+Latency and throughput of the real Flask routes, saved as JSON for comparing runs.
+
+    python benchmarks/bench_api.py                                  # 1k and 100k rows per user
+    python benchmarks/bench_api.py --rows 1000 100000 1000000 --users 4
+    python benchmarks/bench_api.py --modes http --concurrency 16 --duration 20
+    python benchmarks/bench_api.py --compare benchmarks/results/api-20260101-120000.json
+
+For every --rows size, --users synthetic users with that many transactions each
+are seeded into the database (a throwaway one unless --database is given), then
+the route mix (--routes) is driven in each mode:
+
+  client  sequentially through Flask's test client, in this process
+  http    by --concurrency keep-alive connections for --duration seconds against
+          a threaded server started in a child process on a free local port
+
+Reports p50/p95/p99 latency and requests/second per route, and writes them with
+the run's settings and git commit to --output (benchmarks/results/api-<time>.json
+by default). --compare prints the change against an earlier result file.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import make_columns
+
+PASSWORD = 'bench'
+
+# name -> (method, path, JSON body)
+ROUTES = {
+    'add_transaction': ('POST', '/add_transaction', {'type': 'expense', 'category': 'Food', 'amount': 12.5}),
+    'get_transactions': ('GET', '/get_transactions?limit=500', None),
+    'get_transactions_all': ('GET', '/get_transactions', None),
+    'visualize_monthly': ('GET', '/visualize/monthly', None),
+    'budget': ('GET', '/budget', None),
+    'forecast': ('GET', '/forecast', None),
+    'analyze': ('GET', '/analyze', None),
+    'dashboard': ('GET', '/dashboard', None),
+}
+DEFAULT_ROUTES = ['add_transaction', 'get_transactions', 'visualize_monthly', 'budget', 'forecast', 'analyze']
+
+def write_settings(path, database, workers):
+    with open(path, 'w') as f:
+        f.write(f"DATABASE = {database!r}\n"
+                f"FORECAST_WORKERS = {workers}\n"
+                "RECURRING_INTERVAL = 0\n"
+                "LOG_LEVEL = 'WARNING'\n"
+                "LOG_LEVELS = {'werkzeug': 'WARNING'}\n")
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies, seconds):
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'requests': len(values),
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'rps': round(len(values) / seconds, 2) if seconds > 0 else None,
+    }
+
+def request_body(name):
+    method, path, body = ROUTES[name]
+    if body is not None:
+        body = dict(body, date=datetime.date.today().isoformat())
+    return method, path, body
+
+def seed(rows, users):
+    """Creates `users` users with `rows` transactions each; returns their usernames."""
+    import database
+    from werkzeug.security import generate_password_hash
+    password = generate_password_hash(PASSWORD)
+    names = []
+    for i in range(users):
+        username = f"bench-{rows}-{i}"
+        if database.add_user(username, password):
+            user_id = database.get_user_by_username(username)['id']
+            start = time.perf_counter()
+            cols = make_columns(rows, user_id=user_id, seed=i)
+            database.add_transactions(user_id, list(zip(cols['type'], cols['category'], cols['amount'],
+                                                        cols['date'], cols['goal_id'])))
+            print(f"  seeded {username}: {rows:,} transactions in {time.perf_counter() - start:.1f}s")
+        names.append(username)
+    return names
+
+def run_client(app, usernames, routes, rounds):
+    """Every route `rounds` times per user, one request at a time."""
+    latencies = {name: [] for name in routes}
+    busy = {name: 0.0 for name in routes}
+    for username in usernames:
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': PASSWORD})
+        for _ in range(rounds):
+            for name in routes:
+                method, path, body = request_body(name)
+                start = time.perf_counter()
+                response = client.open(path, method=method, json=body)
+                response.get_data()
+                elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    raise RuntimeError(f"{method} {path} returned {response.status_code}")
+                latencies[name].append(elapsed)
+                busy[name] += elapsed
+    return {name: summarize(latencies[name], busy[name]) for name in routes}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(settings, port):
+    env = dict(os.environ, FINANCE_SETTINGS=settings)
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve', '--port', str(port)], env=env)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Benchmark server exited with {proc.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("Benchmark server did not start")
+
+def login(port, username):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    form = urllib.parse.urlencode({'username': username, 'password': PASSWORD})
+    conn.request('POST', '/login', form, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    cookie = response.getheader('Set-Cookie', '').split(';', 1)[0]
+    if response.status != 302 or not cookie:
+        raise RuntimeError(f"Login as {username} failed ({response.status})")
+    return conn, cookie
+
+def run_http(port, usernames, routes, concurrency, duration):
+    """`concurrency` keep-alive connections cycling through the routes until `duration` is up."""
+    latencies = {name: [] for name in routes}
+    errors = []
+    lock = threading.Lock()
+    sessions = [login(port, usernames[i % len(usernames)]) for i in range(concurrency)]
+    start_line = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker(index):
+        conn, cookie = sessions[index]
+        mine = {name: [] for name in routes}
+        step = index  # stagger the workers across the mix
+        start_line.wait()
+        while time.perf_counter() < deadline[0]:
+            name = routes[step % len(routes)]
+            step += 1
+            method, path, body = request_body(name)
+            headers = {'Cookie': cookie}
+            payload = None
+            if body is not None:
+                payload = json.dumps(body)
+                headers['Content-Type'] = 'application/json'
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, payload, headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                with lock:
+                    errors.append(f"{name}: {e}")
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                continue
+            elapsed = time.perf_counter() - start
+            if response.status != 200:
+                with lock:
+                    errors.append(f"{name}: HTTP {response.status}")
+                continue
+            mine[name].append(elapsed)
+        conn.close()
+        with lock:
+            for name, values in mine.items():
+                latencies[name].extend(values)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    deadline[0] = time.perf_counter() + duration
+    started = time.perf_counter()
+    start_line.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    result = {name: summarize(latencies[name], elapsed) for name in routes}
+    result['_total'] = summarize([v for values in latencies.values() for v in values], elapsed)
+    result['_total']['errors'] = len(errors)
+    if errors:
+        print(f"  {len(errors)} errors, first: {errors[0]}")
+    return result
+
+def print_table(title, result):
+    print(f"  {title}")
+    print(f"    {'route':<22}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, stats in result.items():
+        print(f"    {name:<22}{stats['requests']:>10}{stats['p50_ms'] or 0:>10.2f}{stats['p95_ms'] or 0:>10.2f}"
+              f"{stats['p99_ms'] or 0:>10.2f}{stats['rps'] or 0:>10.1f}")
+
+def compare(previous_path, current):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nChange against {previous_path} ({previous['meta'].get('commit') or 'unknown commit'}):")
+    for size, modes in current['results'].items():
+        for mode, routes in modes.items():
+            old_routes = previous['results'].get(size, {}).get(mode, {})
+            for name, stats in routes.items():
+                old = old_routes.get(name)
+                if not old or not old.get('p50_ms') or not stats.get('p50_ms'):
+                    continue
+                deltas = []
+                for key in ('p50_ms', 'p95_ms', 'rps'):
+                    if old.get(key) and stats.get(key):
+                        deltas.append(f"{key} {old[key]:.2f} -> {stats[key]:.2f} ({(stats[key] / old[key] - 1) * 100:+.0f}%)")
+                print(f"  {size} rows {mode:<7}{name:<22}" + ", ".join(deltas))
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=30).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def serve(port):
+    from werkzeug.serving import make_server
+    from app import app
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    server.serve_forever()
+
+def main():
+    if sys.argv[1:2] == ['serve']:
+        parser = argparse.ArgumentParser()
+        parser.add_argument('serve')
+        parser.add_argument('--port', type=int, required=True)
+        serve(parser.parse_args().port)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000], help='transactions per user')
+    parser.add_argument('--users', type=int, default=2, help='users seeded per --rows size')
+    parser.add_argument('--routes', nargs='+', default=DEFAULT_ROUTES, choices=sorted(ROUTES))
+    parser.add_argument('--modes', nargs='+', default=['client', 'http'], choices=['client', 'http'])
+    parser.add_argument('--rounds', type=int, default=20, help='client mode: requests per route per user')
+    parser.add_argument('--concurrency', type=int, default=8, help='http mode: parallel connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='http mode: seconds per --rows size')
+    parser.add_argument('--forecast-workers', type=int, default=0, help="app's FORECAST_WORKERS")
+    parser.add_argument('--database', help='seed and use this database file instead of a temporary one')
+    parser.add_argument('--output', help='result file (default benchmarks/results/api-<time>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    database_path = os.path.abspath(args.database or os.path.join(tmp.name, 'bench.db'))
+    settings = os.path.join(tmp.name, 'settings.py')
+    write_settings(settings, database_path, args.forecast_workers)
+    os.environ['FINANCE_SETTINGS'] = settings
+    from app import app
+    import database
+
+    output = {
+        'meta': {
+            'started': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        },
+        'results': {},
+    }
+    try:
+        for rows in args.rows:
+            print(f"\n{rows:,} transactions per user, {args.users} users")
+            usernames = seed(rows, args.users)
+            results = output['results'][str(rows)] = {}
+            if 'client' in args.modes:
+                # One untimed pass so lazy imports and first-fit forecasts aren't measured
+                run_client(app, usernames, args.routes, 1)
+                results['client'] = run_client(app, usernames, args.routes, args.rounds)
+                print_table('test client', results['client'])
+            if 'http' in args.modes:
+                port = free_port()
+                server = start_server(settings, port)
+                try:
+                    run_http(port, usernames, args.routes, min(args.concurrency, 2), 2)  # warm-up
+                    results['http'] = run_http(port, usernames, args.routes, args.concurrency, args.duration)
+                finally:
+                    server.terminate()
+                    server.wait(30)
+                print_table(f"http, {args.concurrency} connections, {args.duration:g}s", results['http'])
+    finally:
+        database.close_all_connections()
+        tmp.cleanup()
+
+    path = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                       f"api-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults written to {path}")
+    if args.compare:
+        compare(args.compare, output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Request latency with logging off, at the default level, and at full DEBUG.
+
+    python benchmarks/bench_logging.py
+    python benchmarks/bench_logging.py --rounds 100 --history 20000
+
+Runs the app through Flask's test client against a throwaway database seeded
+with synthetic transactions (HTTP response cache disabled, so every request does
+its real work), and replays the same request mix under each logging setup from
+log_setup.configure_logging. Log output goes to a file in the temp directory.
+Reports median and p95 latency per setup.
+"""
+import argparse
+import datetime
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import make_columns
+
+REQUESTS = [
+    ('GET', '/visualize/monthly', None),
+    ('GET', '/get_categories', None),
+    ('GET', '/budget', None),
+    ('GET', '/analyze', None),
+    ('GET', '/investments', None),
+    ('GET', '/get_transactions?limit=200', None),
+    ('POST', '/add_transaction', {'type': 'expense', 'category': 'Food', 'amount': 12.5}),
+]
+
+# name -> configure_logging kwargs
+SETUPS = [
+    ('off (WARNING)', dict(level='WARNING')),
+    ('INFO, queued', dict(level='INFO')),
+    ('DEBUG, sync', dict(level='DEBUG', payload_sample_rate=1.0, use_queue=False)),
+    ('DEBUG, queued', dict(level='DEBUG', payload_sample_rate=1.0)),
+    ('DEBUG, queued, sampled', dict(level='DEBUG', payload_sample_rate=0.01)),
+]
+
+def make_app(tmp):
+    settings = os.path.join(tmp, 'settings.py')
+    with open(settings, 'w') as f:
+        f.write(f"DATABASE = {os.path.join(tmp, 'bench.db')!r}\n"
+                "RECURRING_INTERVAL = 0\nFORECAST_WORKERS = 0\nHTTP_CACHE_ENTRIES = 0\nLOG_LEVEL = 'WARNING'\n")
+    os.environ['FINANCE_SETTINGS'] = settings
+    from app import app
+    return app
+
+def seed(client, history):
+    import database
+    client.post('/register', data={'username': 'bench', 'password': 'bench'})
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    user_id = database.get_user_by_username('bench')['id']
+    cols = make_columns(history, user_id=user_id)
+    database.add_transactions(user_id, list(zip(cols['type'], cols['category'], cols['amount'], cols['date'],
+                                                cols['goal_id'])))
+
+def run(client, rounds):
+    today = datetime.date.today().isoformat()
+    latencies = []
+    for _ in range(rounds):
+        for method, url, body in REQUESTS:
+            start = time.perf_counter()
+            if method == 'GET':
+                response = client.get(url)
+            else:
+                response = client.post(url, json=dict(body, date=today))
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, (url, response.status_code)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--history', type=int, default=5000)
+    args = parser.parse_args()
+
+    import log_setup
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp)
+        client = app.test_client()
+        seed(client, args.history)
+        run(client, 2)  # warm up imports and caches
+        print(f"{len(REQUESTS)} requests x {args.rounds} rounds, {args.history:,} transactions")
+        print(f"  {'setup':<26}{'median ms':>12}{'p95 ms':>10}{'log MB':>10}")
+        for name, kwargs in SETUPS:
+            log_path = os.path.join(tmp, 'app.log')
+            with open(log_path, 'w') as stream:
+                log_setup.configure_logging(stream=stream, **kwargs)
+                latencies = sorted(run(client, args.rounds))
+                log_setup.stop_logging()
+            logging.getLogger().handlers.clear()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            size = os.path.getsize(log_path) / 1e6
+            print(f"  {name:<26}{statistics.median(latencies) * 1000:>12.2f}{p95 * 1000:>10.2f}{size:>10.2f}")
+        import database
+        database.close_all_connections()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Micro-benchmarks for the ml_models functions: scaling with rows and categories.
+
+    python benchmarks/bench_ml_models.py                        # 1k..100k rows x 6..96 categories
+    python benchmarks/bench_ml_models.py --rows 10000 100000 1000000 --categories 6 50
+    python benchmarks/bench_ml_models.py --functions recommend_budget --compare benchmarks/results/ml-<time>.json
+
+Each function runs on synthetic data for every (rows, categories) pair, in the
+style of pytest-benchmark: it is calibrated to a number of calls per round that
+takes at least --min-time, timed over --rounds rounds (min/median/mean/stddev per
+call), then called once more under tracemalloc for its peak allocation.
+
+After the grid, the log-log slope of time against rows (at the most categories)
+and against categories (at the most rows) is reported per function. A rows slope
+above --max-rows-slope means worse than linear; a categories slope above
+--max-categories-slope means the work grows with cardinality, e.g. re-filtering
+the whole frame once per category, which is O(rows x categories). Both are
+flagged. Results go to --output as JSON (benchmarks/results/ml-<time>.json by
+default), and --compare flags functions slower than an earlier run by more than
+--threshold.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import ml_models
+from synthetic import category_names, make_rows
+
+USER_ID = 1
+
+def make_cases(rows, n_categories):
+    """function name -> zero-argument callable, for one data size."""
+    transactions = make_rows(rows, n_categories=n_categories, user_id=USER_ID)
+    df = ml_models.prepare_data(transactions)
+    recommendation = ml_models.recommend_budget(df)
+    assets = [{'current_value': t['amount']} for t in transactions[:rows // 2]]
+    debts = [{'amount_owed': t['amount']} for t in transactions[rows // 2:]]
+    return {
+        'prepare_data': lambda: ml_models.prepare_data(transactions),
+        'detect_overspending': lambda: ml_models.detect_overspending(df),
+        'recommend_budget': lambda: ml_models.recommend_budget(df),
+        'forecast_expenses': lambda: ml_models.forecast_expenses(df),
+        'get_budget_alerts': lambda: ml_models.get_budget_alerts(df, recommendation),
+        'calculate_net_worth': lambda: ml_models.calculate_net_worth(assets, debts),
+    }
+
+FUNCTIONS = ['prepare_data', 'detect_overspending', 'recommend_budget', 'forecast_expenses', 'get_budget_alerts',
+             'calculate_net_worth']
+
+def measure(fn, rounds, min_time):
+    fn()  # warm-up
+    start = time.perf_counter()
+    fn()
+    single = max(time.perf_counter() - start, 1e-7)
+    loops = max(1, math.ceil(min_time / single))
+    per_call = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        per_call.append((time.perf_counter() - start) / loops)
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return {
+        'loops': loops,
+        'rounds': rounds,
+        'min_ms': round(min(per_call) * 1000, 4),
+        'median_ms': round(statistics.median(per_call) * 1000, 4),
+        'mean_ms': round(statistics.fmean(per_call) * 1000, 4),
+        'stddev_ms': round(statistics.stdev(per_call) * 1000, 4) if len(per_call) > 1 else 0.0,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+def slope(points):
+    """Least-squares slope of log(y) against log(x); None with fewer than two usable points."""
+    points = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if var == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var
+
+def scaling(results, functions, rows, categories):
+    """Per function: slope against rows (at max categories) and against categories (at max rows)."""
+    out = {}
+    for name in functions:
+        by_rows = [(n, results[f"{n}x{max(categories)}"][name]['min_ms']) for n in rows]
+        by_categories = [(k, results[f"{max(rows)}x{k}"][name]['min_ms']) for k in categories]
+        out[name] = {'rows_slope': slope(by_rows), 'categories_slope': slope(by_categories)}
+    return out
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=30).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--categories', type=int, nargs='+', default=[6, 24, 96])
+    parser.add_argument('--functions', nargs='+', default=FUNCTIONS, choices=FUNCTIONS)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05, help='seconds per round, at least')
+    parser.add_argument('--max-rows-slope', type=float, default=1.2)
+    parser.add_argument('--max-categories-slope', type=float, default=0.5)
+    parser.add_argument('--output', help='result file (default benchmarks/results/ml-<time>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='--compare: flag slowdowns above this ratio')
+    args = parser.parse_args()
+    rows, categories = sorted(args.rows), sorted(args.categories)
+
+    output = {
+        'meta': {
+            'started': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        # recommend_budget reads saved budgets; give it some for half the categories
+        database.configure(path=os.path.join(tmp, 'bench.db'))
+        database.init_db()
+        try:
+            print(f"  {'function':<22}{'rows':>10}{'cats':>6}{'min ms':>12}{'median ms':>12}"
+                  f"{'stddev':>10}{'peak KB':>12}")
+            for k in categories:
+                database.update_budgets(USER_ID, [(cat, 500.0, True) for cat in category_names(k)[::2]])
+                for n in rows:
+                    cases = make_cases(n, k)
+                    key = f"{n}x{k}"
+                    output['results'][key] = {}
+                    for name in args.functions:
+                        stats = measure(cases[name], args.rounds, args.min_time)
+                        output['results'][key][name] = stats
+                        print(f"  {name:<22}{n:>10,}{k:>6}{stats['min_ms']:>12.3f}{stats['median_ms']:>12.3f}"
+                              f"{stats['stddev_ms']:>10.3f}{stats['peak_kb']:>12,.0f}")
+        finally:
+            database.close_all_connections()
+
+    output['scaling'] = scaling(output['results'], args.functions, rows, categories)
+    print(f"\nScaling (log-log slope; 1.0 = linear)")
+    print(f"  {'function':<22}{'vs rows':>10}{'vs cats':>10}")
+    flagged = []
+    for name, s in output['scaling'].items():
+        notes = []
+        if s['rows_slope'] is not None and s['rows_slope'] > args.max_rows_slope:
+            notes.append('superlinear in rows')
+        if s['categories_slope'] is not None and s['categories_slope'] > args.max_categories_slope:
+            notes.append('grows with categories (O(rows x categories)?)')
+        if notes:
+            flagged.append(name)
+        fmt = lambda v: f"{v:>10.2f}" if v is not None else f"{'-':>10}"
+        print(f"  {name:<22}{fmt(s['rows_slope'])}{fmt(s['categories_slope'])}  {'; '.join(notes)}")
+    output['flagged'] = flagged
+
+    path = args.output or os.path.join(ROOT, 'benchmarks', 'results', f"ml-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nChange against {args.compare} ({previous['meta'].get('commit') or 'unknown commit'}):")
+        for key, functions in output['results'].items():
+            for name, stats in functions.items():
+                old = previous['results'].get(key, {}).get(name)
+                if not old:
+                    continue
+                ratio = stats['min_ms'] / old['min_ms'] if old['min_ms'] else float('inf')
+                mark = '  SLOWER' if ratio > 1 + args.threshold else ''
+                print(f"  {name:<22}{key:>14}{old['min_ms']:>12.3f} -> {stats['min_ms']:<12.3f}"
+                      f"({(ratio - 1) * 100:+.0f}%){mark}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Parity check and timings for the ml_numpy engine against ml_models.
+
+    python benchmarks/bench_ml_numpy.py                # 10k, 100k and 1M rows
+    python benchmarks/bench_ml_numpy.py --rows 10000 --repeat 5
+
+Every size is first checked for identical output from both engines (over a few
+seeds and category counts, including the empty and expense-only cases), then
+each analytics function is timed on the prepared DataFrame vs TransactionArrays.
+Runs against a throwaway database so recommend_budget's get_budgets() works.
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import ml_models
+import ml_numpy
+from synthetic import make_columns
+
+FUNCTIONS = ['detect_overspending', 'recommend_budget', 'investment_suggestions', 'get_offers', 'get_budget_alerts']
+
+def run(module, name, data):
+    if name == 'get_budget_alerts':
+        return module.get_budget_alerts(data, module.recommend_budget(data))
+    return getattr(module, name)(data)
+
+def same(a, b, path='result'):
+    """Raises AssertionError on the first difference (floats compared to 1e-9 relative)."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        assert list(a) == list(b), f"{path}: keys {list(a)} != {list(b)}"
+        for key in a:
+            same(a[key], b[key], f"{path}[{key!r}]")
+    elif isinstance(a, list) and isinstance(b, list):
+        assert len(a) == len(b), f"{path}: length {len(a)} != {len(b)}"
+        for i, (x, y) in enumerate(zip(a, b)):
+            same(x, y, f"{path}[{i}]")
+    elif isinstance(a, float) or isinstance(b, float):
+        assert math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9), f"{path}: {a!r} != {b!r}"
+    else:
+        assert a == b, f"{path}: {a!r} != {b!r}"
+
+def build(columns):
+    df = ml_models.prepare_data(columns)
+    return df, ml_numpy.TransactionArrays.from_frame(df)
+
+def check_parity(n_rows):
+    cases = [dict(seed=seed, n_categories=k) for seed in (0, 1) for k in (3, 6, 12)]
+    cases.append(dict(seed=2, income_share=0.0))
+    for case in cases:
+        df, ta = build(make_columns(n_rows, **case))
+        for name in FUNCTIONS:
+            try:
+                same(run(ml_models, name, df), run(ml_numpy, name, ta))
+            except AssertionError as e:
+                raise AssertionError(f"{name} differs for {n_rows} rows {case}: {e}") from None
+    df, ta = build(make_columns(0))
+    for name in FUNCTIONS:
+        same(run(ml_models, name, df), run(ml_numpy, name, ta))
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench(n_rows, repeat):
+    columns = make_columns(n_rows)
+    start = time.perf_counter()
+    df = ml_models.prepare_data(columns)
+    prepare_s = time.perf_counter() - start
+    start = time.perf_counter()
+    ta = ml_numpy.TransactionArrays.from_frame(df)
+    arrays_s = time.perf_counter() - start
+    print(f"\n{n_rows:,} rows (prepare_data {prepare_s * 1000:.1f} ms, TransactionArrays {arrays_s * 1000:.1f} ms)")
+    print(f"  {'function':<24}{'pandas ms':>12}{'numpy ms':>12}{'speedup':>10}")
+    for name in FUNCTIONS:
+        pandas_s = best_of(lambda: run(ml_models, name, df), repeat)
+        numpy_s = best_of(lambda: run(ml_numpy, name, ta), repeat)
+        print(f"  {name:<24}{pandas_s * 1000:>12.2f}{numpy_s * 1000:>12.2f}{pandas_s / numpy_s:>9.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-parity', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(path=os.path.join(tmp, 'bench.db'))
+        database.init_db()
+        try:
+            for n_rows in args.rows:
+                if not args.skip_parity:
+                    check_parity(n_rows)
+                    print(f"parity ok at {n_rows:,} rows")
+                bench(n_rows, args.repeat)
+        finally:
+            database.close_all_connections()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Replay check for the incremental overspending state behind /analyze.
+
+    python benchmarks/replay_overspending.py
+    python benchmarks/replay_overspending.py --steps 2000 --history 200000
+
+Applies a random mix of single and batch adds and deletes (backdated entries,
+same-day ties, income in between) through database.py, only ever updating the
+state incrementally. After every step it asserts that ml_models.get_overspending
+(from the maintained state) equals ml_models.detect_overspending over the full
+history; at the end it asserts that the state equals, to the cent, a single
+fresh rebuild. Then times both paths on a large history.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import ml_models
+from synthetic import make_columns
+
+CATEGORIES = ['Food', 'Travel', 'Rent', 'Utilities', 'Shopping']
+
+def full_result(user_id):
+    return ml_models.detect_overspending(ml_models.prepare_data(database.get_transactions(user_id)))
+
+def stored_state(user_id):
+    """The expense state to the cent: running totals drift in the last bits, rebuilt ones don't."""
+    totals, recent = database.get_expense_state(user_id)
+    return {k: (round(t, 2), n) for k, (t, n) in totals.items()}, [(cat, round(a, 2)) for cat, a in recent]
+
+def random_row(rng, today):
+    trans_type = 'income' if rng.random() < 0.2 else 'expense'
+    category = 'Salary' if trans_type == 'income' else rng.choice(CATEGORIES)
+    # Few distinct days, so ties on date are common
+    date = (today - datetime.timedelta(days=rng.randrange(60))).isoformat()
+    return trans_type, category, round(rng.uniform(1, 500), 2), date
+
+def replay(user_id, steps, seed):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    for step in range(steps):
+        ids = [t['id'] for t in database.get_transactions(user_id)]
+        op = rng.random()
+        if op < 0.45 or not ids:
+            database.add_transaction(user_id, *random_row(rng, today))
+        elif op < 0.6:
+            database.add_transactions(user_id, [random_row(rng, today) + (0,) for _ in range(rng.randrange(1, 40))])
+        elif op < 0.85:
+            database.delete_transaction(user_id, rng.choice(ids))
+        else:
+            database.delete_transactions(user_id, rng.sample(ids, min(len(ids), rng.randrange(1, 25))))
+
+        expected = full_result(user_id)
+        got = ml_models.get_overspending(user_id)
+        assert got == expected, f"step {step}: {got} != {expected}"
+
+    state, result = stored_state(user_id), ml_models.get_overspending(user_id)
+    database.rebuild_rollups(user_id)
+    rebuilt = stored_state(user_id)
+    assert rebuilt == state, f"state after {steps} steps differs from a rebuild: {state} != {rebuilt}"
+    assert ml_models.get_overspending(user_id) == result, "rebuild changed get_overspending"
+    print(f"replay ok: {steps} steps, {len(database.get_transactions(user_id))} transactions left")
+
+def bench(user_id, history, repeat):
+    cols = make_columns(history, user_id=user_id)
+    database.add_transactions(user_id, list(zip(cols['type'], cols['category'], cols['amount'], cols['date'],
+                                                cols['goal_id'])))
+    df = ml_models.prepare_data(database.get_transactions(user_id))
+    assert ml_models.detect_overspending(df) == ml_models.get_overspending(user_id)
+    for name, fn in [('detect_overspending(df)', lambda: ml_models.detect_overspending(df)),
+                     ('get_overspending(user_id)', lambda: ml_models.get_overspending(user_id))]:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        print(f"  {name:<28}{best * 1000:10.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(path=os.path.join(tmp, 'replay.db'))
+        database.init_db()
+        try:
+            replay(1, args.steps, args.seed)
+            print(f"{args.history:,} transactions:")
+            bench(2, args.history, args.repeat)
+        finally:
+            database.close_all_connections()
+
+if __name__ == '__main__':
+    main()
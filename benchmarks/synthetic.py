@@ -0,0 +1,37 @@
+import numpy as np
+
+DEFAULT_CATEGORIES = ['Food', 'Travel', 'Rent', 'Utilities', 'Shopping', 'Other']
+
+def category_names(n_categories):
+    if n_categories <= len(DEFAULT_CATEGORIES):
+        return DEFAULT_CATEGORIES[:n_categories]
+    return DEFAULT_CATEGORIES + [f"Category {i}" for i in range(len(DEFAULT_CATEGORIES), n_categories)]
+
+def make_columns(n_rows, n_categories=6, user_id=1, days=3 * 365, income_share=0.1, seed=0, end_date='2026-10-31'):
+    """
+    Synthetic transaction columns (same fields as database.get_transactions) for
+    one user, as a dict of lists that ml_models.prepare_data accepts directly.
+    Expenses are spread over `days` days ending at end_date; roughly
+    income_share of rows are Salary income.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(category_names(n_categories), dtype=object)
+    is_income = rng.random(n_rows) < income_share
+    categories = np.where(is_income, 'Salary', names[rng.integers(0, len(names), n_rows)])
+    amounts = np.where(is_income, rng.uniform(20000, 90000, n_rows), rng.gamma(2.0, 400.0, n_rows)).round(2)
+    dates = np.datetime64(end_date) - rng.integers(0, days, n_rows).astype('timedelta64[D]')
+    return {
+        'id': np.arange(1, n_rows + 1).tolist(),
+        'user_id': [user_id] * n_rows,
+        'type': np.where(is_income, 'income', 'expense').tolist(),
+        'category': categories.tolist(),
+        'amount': amounts.tolist(),
+        'date': dates.astype(str).tolist(),
+        'goal_id': [0] * n_rows,
+    }
+
+def make_rows(n_rows, **kwargs):
+    """Same data as make_columns, as the list of dicts database.get_transactions returns."""
+    cols = make_columns(n_rows, **kwargs)
+    keys = list(cols)
+    return [dict(zip(keys, values)) for values in zip(*cols.values())]
@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """
+    Small thread-safe LRU mapping shared by the in-process caches
+    (prepared transaction frames, forecasts, responses, ...). Bounded by entry
+    count, and optionally by total weight (e.g. bytes) as measured by `weigher`.
+    """
+    def __init__(self, max_size=128, max_weight=None, weigher=None):
+        self.max_size = max_size
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self._data = OrderedDict()
+        self._weights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if self.weigher is not None:
+                weight = self.weigher(value)
+                if self.max_weight is not None and weight > self.max_weight:
+                    return
+                self.weight += weight - self._weights.get(key, 0)
+                self._weights[key] = weight
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size or (self.max_weight is not None and self.weight > self.max_weight):
+                evicted, _ = self._data.popitem(last=False)
+                self.weight -= self._weights.pop(evicted, 0)
+                logger.debug("LRU cache evicted key %s", evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self.weight -= self._weights.pop(key, 0)
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
@@ -0,0 +1,76 @@
+import zlib
+from flask import request
+import logging
+
+logger = logging.getLogger(__name__)
+
+# gzip/deflate Content-Encoding for text responses, negotiated from the request's
+# Accept-Encoding. Applied from an after_request hook, so http_cache keeps the
+# uncompressed body and any client gets the encoding it asked for. Compressed
+# responses carry a weak ETag (same data, different bytes); http_cache compares
+# If-None-Match weakly, so revalidation works for both encodings.
+
+LEVEL = 6
+MIN_SIZE = 1024
+MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript'}
+
+# Preferred first when the client weighs them equally
+ENCODINGS = ('gzip', 'deflate')
+# zlib window bits: 16 + 15 writes a gzip header, 15 the zlib format HTTP calls deflate
+_WBITS = {'gzip': 31, 'deflate': 15}
+
+def configure(level=None, min_size=None):
+    """level 0 turns compression off."""
+    global LEVEL, MIN_SIZE
+    if level is not None:
+        LEVEL = int(level)
+    if min_size is not None:
+        MIN_SIZE = int(min_size)
+
+def _compress_stream(chunks, wbits):
+    # Sync flush after every chunk, so a streamed response still reaches the
+    # client as it is produced
+    compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, wbits)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def compress_response(response):
+    """
+    Compresses `response` in place with the best encoding the client accepts.
+    Skips small bodies (under MIN_SIZE), non-text types, files sent with
+    direct_passthrough and anything already encoded.
+    """
+    if (LEVEL <= 0 or response.mimetype not in MIMETYPES or response.direct_passthrough
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers or request.method == 'HEAD'):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+    try:
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, _WBITS[encoding])
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < MIN_SIZE:
+                return response
+            compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, _WBITS[encoding])
+            response.set_data(compressor.compress(data) + compressor.flush())
+    except Exception as e:
+        logger.error(f"Error compressing response: {str(e)}")
+        return response
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
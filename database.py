@@ -1,19 +1,289 @@
 import sqlite3
-import pandas as pd
+import collections
+import datetime
+import itertools
+import operator
+import queue
+import threading
+import time
 from flask_login import UserMixin
+from cache import LRUCache
+import metrics
 import logging
 
 logger = logging.getLogger(__name__)
+# Row payloads; DEBUG records here are sampled (see log_setup)
+payload_logger = logging.getLogger(f"{__name__}.payload")
 
 class User(UserMixin):
     def __init__(self, id, username):
         self.id = id
         self.username = username
 
+# Connection pool settings. Overridden from the Flask config via configure().
+DB_PATH = 'finance.db'
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT = 30.0
+# Derive transaction versions from the persisted data_versions table, so caches
+# in every process using the database (other server workers, CLI imports, cron
+# runs) notice each other's writes. False uses a counter local to this process,
+# which is only correct when no other process ever writes.
+SHARED_VERSIONS = True
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,       # negative = KiB, i.e. ~16MB page cache per connection
+    'mmap_size': 268435456,     # 256MB memory-mapped I/O
+    'temp_store': 'MEMORY',
+}
+
+class CountingCursor(sqlite3.Cursor):
+    """Cursor that reports statements executed and rows fetched to metrics."""
+    def execute(self, sql, parameters=()):
+        metrics.count_query()
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        metrics.count_query()
+        return super().executemany(sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            metrics.count_rows(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        metrics.count_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        metrics.count_rows(len(rows))
+        return rows
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers which database file it was opened on."""
+    db_path = None
+
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+_pool = queue.LifoQueue()
+_pool_lock = threading.Lock()
+
+def configure(path=None, pool_size=None, statement_cache_size=None, busy_timeout=None, pragmas=None,
+              shared_versions=None):
+    """
+    Applies connection settings (usually from app.config) and drops any pooled
+    connections so new ones pick up the changes.
+    """
+    global DB_PATH, POOL_SIZE, STATEMENT_CACHE_SIZE, BUSY_TIMEOUT, SHARED_VERSIONS
+    with _pool_lock:
+        if shared_versions is not None:
+            SHARED_VERSIONS = bool(shared_versions)
+        if path is not None:
+            DB_PATH = path
+        if pool_size is not None:
+            POOL_SIZE = int(pool_size)
+        if statement_cache_size is not None:
+            STATEMENT_CACHE_SIZE = int(statement_cache_size)
+        if busy_timeout is not None:
+            BUSY_TIMEOUT = float(busy_timeout)
+        if pragmas:
+            PRAGMAS.update(pragmas)
+    close_all_connections()
+    # Cached users belong to the previous database
+    _user_cache.clear()
+    logger.info(f"Database configured: path={DB_PATH}, pool_size={POOL_SIZE}, pragmas={PRAGMAS}")
+
+def _new_connection():
+    # check_same_thread=False: pooled connections are handed to whichever request
+    # thread asks next, but only ever used by one thread at a time.
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE, factory=PooledConnection)
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    conn.db_path = DB_PATH
+    return conn
+
+def get_connection():
+    """
+    Returns a pooled connection, opening a new one if the pool is empty.
+    Every caller must hand it back with release_connection().
+    """
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        return _new_connection()
+    if conn.db_path != DB_PATH:
+        conn.close()
+        return _new_connection()
+    return conn
+
+def release_connection(conn):
+    """
+    Returns a connection to the pool. Any transaction the caller left open
+    (e.g. an early return before commit) is rolled back first.
+    """
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        if conn.db_path == DB_PATH and _pool.qsize() < POOL_SIZE:
+            _pool.put_nowait(conn)
+            return
+    except sqlite3.Error as e:
+        logger.warning(f"Discarding broken database connection: {str(e)}")
+    conn.close()
+
+def close_all_connections():
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
+
+# Composite indexes for the per-user access patterns. Created with IF NOT EXISTS so
+# init_db() also migrates databases created before they were added.
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_category_date ON transactions (user_id, category, date)",
+    "CREATE INDEX IF NOT EXISTS idx_categories_user ON categories (user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_goals_user_deadline ON goals (user_id, deadline)",
+    "CREATE INDEX IF NOT EXISTS idx_debts_user ON debts (user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_recurring_transactions_user ON recurring_transactions (user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_recurring_transactions_next_due ON recurring_transactions (next_due)",
+    "CREATE INDEX IF NOT EXISTS idx_assets_user ON assets (user_id)",
+]
+
+# Representative form of every query issued below, checked by check_query_plans().
+QUERY_PLAN_CHECKS = {
+    'get_user_by_username': ("SELECT id, username, password FROM users WHERE username = ?", ('',)),
+    'get_user_by_id': ("SELECT id, username FROM users WHERE id = ?", (0,)),
+    'delete_transaction': ("DELETE FROM transactions WHERE id = ? AND user_id = ?", (0, 0)),
+    'delete_transactions': ("SELECT id, type, category, amount, date FROM transactions WHERE user_id = ? AND id IN (?, ?)",
+                            (0, 0, 0)),
+    'get_categories': ("SELECT category FROM categories WHERE user_id = ? OR user_id = 0", (0,)),
+    'get_transactions': ("SELECT id, user_id, type, category, amount, date, goal_id FROM transactions "
+                         "WHERE user_id = ?", (0,)),
+    'get_transactions(date range)': ("SELECT id, user_id, type, category, amount, date, goal_id FROM transactions "
+                                     "WHERE user_id = ? AND date >= ? AND date <= ?", (0, '', '')),
+    'get_transactions(category)': ("SELECT id, user_id, type, category, amount, date, goal_id FROM transactions "
+                                   "WHERE user_id = ? AND category = ?", (0, '')),
+    'get_transactions(date range, category)': ("SELECT id, user_id, type, category, amount, date, goal_id FROM transactions "
+                                               "WHERE user_id = ? AND date >= ? AND date <= ? AND category = ?", (0, '', '', '')),
+    'get_transactions(after)': ("SELECT id, user_id, type, category, amount, date, goal_id FROM transactions "
+                                "WHERE user_id = ? AND (date, id) > (?, ?) ORDER BY date, id LIMIT ?", (0, '', 0, 100)),
+    'get_transactions(category, after)': ("SELECT id, user_id, type, category, amount, date, goal_id FROM transactions "
+                                          "WHERE user_id = ? AND category = ? AND (date, id) > (?, ?) "
+                                          "ORDER BY date, id LIMIT ?", (0, '', '', 0, 100)),
+    'get_daily_totals': ("SELECT day, type, category, total, count FROM daily_totals "
+                         "WHERE user_id = ? AND day >= ? AND day <= ?", (0, '', '')),
+    'get_monthly_totals': ("SELECT month, type, category, total, count FROM monthly_totals "
+                           "WHERE user_id = ? AND month >= ? AND month <= ?", (0, '', '')),
+    'get_totals_by_type': ("SELECT type, SUM(total) FROM daily_totals WHERE user_id = ? AND day >= ? AND day <= ? "
+                           "GROUP BY type", (0, '', '')),
+    'get_totals_by_category': ("SELECT category, SUM(total) FROM daily_totals WHERE user_id = ? AND type = ? "
+                               "AND day >= ? AND day <= ? GROUP BY category", (0, '', '', '')),
+    'compare_periods': ("SELECT category, SUM(CASE WHEN day BETWEEN ? AND ? THEN total END) FROM daily_totals "
+                        "WHERE user_id = ? AND type = ? AND day >= ? AND day <= ? GROUP BY category", ('', '', 0, '', '', '')),
+    'get_expense_fingerprint': ("SELECT COALESCE(SUM(total), 0), COALESCE(SUM(count), 0) FROM monthly_totals "
+                                "WHERE user_id = ? AND type = 'expense'", (0,)),
+    'get_stored_forecast': ("SELECT next_month_exp, method, expense_total, expense_count, computed_at FROM forecasts "
+                            "WHERE user_id = ?", (0,)),
+    'get_expense_state(totals)': ("SELECT category, total, count FROM expense_totals WHERE user_id = ? ORDER BY category", (0,)),
+    'get_expense_state(recent)': ("SELECT category, amount FROM recent_expenses WHERE user_id = ? ORDER BY date, id", (0,)),
+    'refill_recent_expenses': ("SELECT user_id, date, id, category, amount FROM transactions WHERE user_id = ? "
+                               "AND type = 'expense' ORDER BY date DESC, id DESC LIMIT ?", (0, 30)),
+    'get_data_version': ("SELECT version FROM data_versions WHERE user_id = ?", (0,)),
+    'get_goals': ("SELECT id, goal_name, target_amount, current_amount, deadline FROM goals WHERE user_id = ?", (0,)),
+    'update_goal_progress': ("UPDATE goals SET current_amount = current_amount + ? WHERE id = ? AND user_id = ?", (0, 0, 0)),
+    'next_savings_goal': ("SELECT id FROM goals WHERE user_id = ? AND deadline > ? AND current_amount < target_amount "
+                          "ORDER BY deadline, id LIMIT 1", (0, '')),
+    'next_savings_goals': ("SELECT id, current_amount, target_amount FROM goals WHERE user_id = ? AND deadline > ? "
+                           "AND current_amount < target_amount ORDER BY deadline, id LIMIT 1", (0, '')),
+    'next_savings_goals(update)': ("UPDATE goals SET current_amount = ? WHERE id = ? AND user_id = ?", (0, 0, 0)),
+    'add_transactions(goals)': ("UPDATE goals SET current_amount = current_amount + ? WHERE id = ? AND user_id = ?", (0, 0, 0)),
+    'delete_goal': ("DELETE FROM goals WHERE id = ? AND user_id = ?", (0, 0)),
+    'get_debts': ("SELECT id, name, amount_owed, interest_rate, min_payment, due_date FROM debts WHERE user_id = ?", (0,)),
+    'pay_off_debt': ("UPDATE debts SET amount_owed = MAX(0, amount_owed - ?) WHERE id = ? AND user_id = ?", (0, 0, 0)),
+    'get_recurring_transactions': ("SELECT id, type, category, amount, start_date, frequency, next_due, last_materialized "
+                                   "FROM recurring_transactions WHERE user_id = ?", (0,)),
+    'get_due_recurring_transactions': ("SELECT id, user_id, type, category, amount, start_date, frequency, next_due "
+                                       "FROM recurring_transactions WHERE next_due <= ? AND (next_due, id) > (?, ?) "
+                                       "ORDER BY next_due, id LIMIT ?", ('', '', 0, 1000)),
+    'materialize_recurring': ("UPDATE recurring_transactions SET next_due = ?, last_materialized = COALESCE(?, last_materialized) "
+                              "WHERE id = ? AND next_due = ?", ('', '', 0, '')),
+    'get_assets': ("SELECT id, name, type, current_value FROM assets WHERE user_id = ?", (0,)),
+    'get_budgets': ("SELECT category, amount, alert_enabled FROM budgets WHERE user_id = ?", (0,)),
+}
+
+def check_query_plans():
+    """
+    Runs EXPLAIN QUERY PLAN for every entry in QUERY_PLAN_CHECKS and logs a warning
+    for each one that falls back to a full table scan. Returns the offending names.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    unindexed = []
+    try:
+        for name, (sql, params) in QUERY_PLAN_CHECKS.items():
+            c.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            details = [row[3] for row in c.fetchall()]
+            if any(d.startswith('SCAN') and 'INDEX' not in d for d in details):
+                unindexed.append(name)
+                logger.warning(f"Query plan for {name} does not use an index: {'; '.join(details)}")
+        if not unindexed:
+            logger.info(f"All {len(QUERY_PLAN_CHECKS)} checked queries use an index")
+        return unindexed
+    finally:
+        release_connection(conn)
+
+# Per-user versions that caches of derived data (see ml_models.get_transactions_df)
+# compare against instead of being invalidated explicitly. By default this is the
+# persisted data version, so a write from any process moves it; with
+# SHARED_VERSIONS off it is a process-local counter bumped on every committed
+# change to a user's transactions.
+_transaction_versions = {}
+_version_counter = itertools.count(1)
+
+def get_transactions_version(user_id):
+    if SHARED_VERSIONS:
+        # Also moves on non-transaction writes; costs a primary-key lookup per call
+        return get_data_version(user_id)
+    return _transaction_versions.get(int(user_id), 0)
+
+def bump_transactions_version(user_id):
+    _transaction_versions[int(user_id)] = next(_version_counter)
+
+# Per-user data versions for HTTP caching: bumped inside the same transaction as
+# every write to a user's data, and persisted, so every process sees the same
+# version and a version never repeats for a user.
+def _bump_data_version(c, user_id):
+    """Bumps one user's data version (everyone's if user_id is None), inside the caller's transaction."""
+    if user_id is None:
+        c.execute("UPDATE data_versions SET version = version + 1")
+        return
+    c.execute("INSERT INTO data_versions (user_id, version) VALUES (?, 1) "
+              "ON CONFLICT(user_id) DO UPDATE SET version = version + 1", (int(user_id),))
+
+def get_data_version(user_id):
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("SELECT version FROM data_versions WHERE user_id = ?", (int(user_id),))
+        row = c.fetchone()
+        return row[0] if row else 0
+    finally:
+        release_connection(conn)
+
 # database.py
 def init_db():
     try:
-        conn = sqlite3.connect('finance.db')
+        conn = get_connection()
         c = conn.cursor()
         c.execute('''CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT
@@ -31,8 +301,10 @@ def init_db():
             id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT, amount_owed REAL, interest_rate REAL, min_payment REAL, due_date DATE
         )''')
         c.execute('''CREATE TABLE IF NOT EXISTS recurring_transactions (
-            id INTEGER PRIMARY KEY, user_id INTEGER, type TEXT, category TEXT, amount REAL, start_date DATE, frequency TEXT
+            id INTEGER PRIMARY KEY, user_id INTEGER, type TEXT, category TEXT, amount REAL, start_date DATE, frequency TEXT,
+            next_due DATE, last_materialized DATE
         )''')
+        _migrate_recurring_transactions(c)
         c.execute('''CREATE TABLE IF NOT EXISTS assets (
             id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT, type TEXT, current_value REAL
         )''')
@@ -41,24 +313,89 @@ def init_db():
             PRIMARY KEY (user_id, category),
             FOREIGN KEY (user_id) REFERENCES users(id)
         )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS data_versions (
+            user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL
+        )''')
+        # Written by the batch forecasting job (ml_models.batch_forecast)
+        c.execute('''CREATE TABLE IF NOT EXISTS forecasts (
+            user_id INTEGER PRIMARY KEY, next_month_exp REAL, method TEXT,
+            expense_total REAL, expense_count INTEGER, computed_at TEXT
+        )''')
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_totals'")
+        rollups_exist = c.fetchone() is not None
+        # Rollups of transactions maintained by add_transaction/delete_transaction
+        c.execute('''CREATE TABLE IF NOT EXISTS daily_totals (
+            user_id INTEGER, day TEXT, type TEXT, category TEXT, total REAL, count INTEGER,
+            PRIMARY KEY (user_id, day, type, category)
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS monthly_totals (
+            user_id INTEGER, month TEXT, type TEXT, category TEXT, total REAL, count INTEGER,
+            PRIMARY KEY (user_id, month, type, category)
+        )''')
+        if not rollups_exist:
+            _rebuild_rollups(c)
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expense_totals'")
+        expense_state_exists = c.fetchone() is not None
+        # Incremental state behind /analyze: per-category expense totals and the latest RECENT_EXPENSES expenses
+        c.execute('''CREATE TABLE IF NOT EXISTS expense_totals (
+            user_id INTEGER, category TEXT, total REAL, count INTEGER,
+            PRIMARY KEY (user_id, category)
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS recent_expenses (
+            user_id INTEGER, date DATE, id INTEGER, category TEXT, amount REAL,
+            PRIMARY KEY (user_id, date, id)
+        ) WITHOUT ROWID''')
+        if not expense_state_exists:
+            _rebuild_expense_state(c)
+        for index_sql in INDEXES:
+            c.execute(index_sql)
         # Insert default categories
         default_categories = ['Food', 'Travel', 'Salary', 'Rent', 'Utilities', 'Shopping', 'Other', 'Savings']
         for cat in default_categories:
             c.execute("INSERT OR IGNORE INTO categories (user_id, category) VALUES (?, ?)", (0, cat))
         conn.commit()
+        # Refresh planner statistics for the indexes above (cheap; only re-analyzes when stale)
+        c.execute("PRAGMA optimize")
         logger.info("Database initialized successfully with new tables")
     except Exception as e:
         logger.error(f"Error initializing database: {str(e)}")
         raise
     finally:
-        conn.close()
+        release_connection(conn)
+
+def _migrate_recurring_transactions(c):
+    """
+    Adds the next_due/last_materialized columns to databases created before the
+    recurring materializer. Existing rules start from their next occurrence on or
+    after today rather than back-filling history users may have entered by hand.
+    """
+    c.execute("PRAGMA table_info(recurring_transactions)")
+    if 'next_due' in [row[1] for row in c.fetchall()]:
+        return
+    from recurring import first_due_on_or_after  # Import here to avoid circular imports
+    c.execute("ALTER TABLE recurring_transactions ADD COLUMN next_due DATE")
+    c.execute("ALTER TABLE recurring_transactions ADD COLUMN last_materialized DATE")
+    c.execute("SELECT id, start_date, frequency FROM recurring_transactions")
+    today = datetime.date.today()
+    updates = []
+    for rule_id, start_date, frequency in c.fetchall():
+        try:
+            next_due = first_due_on_or_after(start_date, frequency, today)
+        except ValueError:
+            next_due = None
+        updates.append((next_due.isoformat() if next_due else None, rule_id))
+    c.executemany("UPDATE recurring_transactions SET next_due = ? WHERE id = ?", updates)
+    logger.info(f"Added next_due to {len(updates)} recurring transactions")
 
 def add_user(username, password):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
         conn.commit()
+        # Ids aren't AUTOINCREMENT: if the highest one was deleted (by hand, there is no delete
+        # path here) it is handed out again, and the user cache may still hold its old owner
+        invalidate_user(c.lastrowid)
         logger.info(f"User added: {username}")
         return True
     except sqlite3.IntegrityError:
@@ -68,82 +405,687 @@ def add_user(username, password):
         logger.error(f"Error adding user {username}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_user_by_username(username):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("SELECT id, username, password FROM users WHERE username = ?", (username,))
         user = c.fetchone()
         if user:
-            logger.debug(f"User found: {username}")
+            logger.debug("User found: %s", username)
             return {'id': user[0], 'username': user[1], 'password': user[2]}
-        logger.debug(f"User not found: {username}")
+        logger.debug("User not found: %s", username)
         return None
     except Exception as e:
         logger.error(f"Error fetching user {username}: {str(e)}")
         return None
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_user_by_id(user_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
         user = c.fetchone()
         if user:
-            logger.debug(f"User found by ID: {user_id}")
+            logger.debug("User found by ID: %s", user_id)
             return User(user[0], user[1])
-        logger.debug(f"User not found by ID: {user_id}")
+        logger.debug("User not found by ID: %s", user_id)
         return None
     except Exception as e:
         logger.error(f"Error fetching user by ID {user_id}: {str(e)}")
         return None
     finally:
-        conn.close()
+        release_connection(conn)
+
+# Flask-Login loads the user on every authenticated request; keep recent ones in
+# memory for USER_CACHE_TTL seconds. str(user_id) -> (expires at, User)
+USER_CACHE_TTL = 60.0
+_user_cache = LRUCache(max_size=1024)
+
+def configure_user_cache(max_size=None, ttl=None):
+    global USER_CACHE_TTL
+    if max_size is not None:
+        _user_cache.max_size = int(max_size)
+    if ttl is not None:
+        USER_CACHE_TTL = float(ttl)
+    _user_cache.clear()
+
+def get_cached_user(user_id):
+    """
+    get_user_by_id through the user cache. Unknown ids aren't cached, and a
+    change made by another process shows up within USER_CACHE_TTL seconds;
+    in this process, every write to the users table calls invalidate_user.
+    """
+    key = str(user_id)
+    if USER_CACHE_TTL > 0:
+        cached = _user_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+    user = get_user_by_id(user_id)
+    if user is not None and USER_CACHE_TTL > 0:
+        _user_cache.set(key, (time.monotonic() + USER_CACHE_TTL, user))
+    return user
+
+def invalidate_user(user_id=None):
+    """Drops a user (or, with no id, every user) from the user cache."""
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(str(user_id))
+
+# Rollup tables: daily_totals is keyed by 'YYYY-MM-DD', monthly_totals by 'YYYY-MM'.
+_ROLLUPS = [('daily_totals', 'day', 10), ('monthly_totals', 'month', 7)]
+
+def _apply_to_rollups(c, user_id, trans_type, category, amount, date, sign):
+    """Adds (sign=1) or removes (sign=-1) one transaction from the rollups, inside the caller's transaction."""
+    for table, key, width in _ROLLUPS:
+        c.execute(f"INSERT INTO {table} (user_id, {key}, type, category, total, count) "
+                  f"VALUES (?, substr(?, 1, {width}), ?, ?, ?, ?) "
+                  f"ON CONFLICT(user_id, {key}, type, category) DO UPDATE SET "
+                  f"total = total + excluded.total, count = count + excluded.count",
+                  (user_id, date, trans_type, category, sign * float(amount), sign))
+        if sign < 0:
+            c.execute(f"DELETE FROM {table} WHERE user_id = ? AND {key} = substr(?, 1, {width}) "
+                      f"AND type = ? AND category = ? AND count <= 0",
+                      (user_id, date, trans_type, category))
+
+def _sum_deltas(rows, sign, deltas=None):
+    """
+    Sums (type, category, amount, date) rows into {(day, type, category): (total,
+    count)} deltas, added to `deltas` when given, so a bulk write can collect them
+    across batches and hand them to the rollup/expense-state writers once.
+    """
+    deltas = {} if deltas is None else deltas
+    for trans_type, category, amount, date in rows:
+        k = (str(date)[:10], trans_type, category)
+        total, count = deltas.get(k, (0.0, 0))
+        deltas[k] = (total + sign * float(amount), count + sign)
+    return deltas
+
+def _apply_many_to_rollups(c, user_id, rows, sign):
+    """
+    _apply_to_rollups for many (type, category, amount, date) rows: the deltas are
+    summed per rollup key first, so each key is written once per call.
+    """
+    _apply_deltas_to_rollups(c, user_id, _sum_deltas(rows, sign), sign)
+
+def _apply_deltas_to_rollups(c, user_id, deltas, sign):
+    for table, key, width in _ROLLUPS:
+        keyed = {}
+        for (day, trans_type, category), (total, count) in deltas.items():
+            k = (day[:width], trans_type, category)
+            previous_total, previous_count = keyed.get(k, (0.0, 0))
+            keyed[k] = (previous_total + total, previous_count + count)
+        c.executemany(f"INSERT INTO {table} (user_id, {key}, type, category, total, count) "
+                      f"VALUES (?, ?, ?, ?, ?, ?) "
+                      f"ON CONFLICT(user_id, {key}, type, category) DO UPDATE SET "
+                      f"total = total + excluded.total, count = count + excluded.count",
+                      [(user_id, k[0], k[1], k[2], total, count) for k, (total, count) in keyed.items()])
+        if sign < 0:
+            c.executemany(f"DELETE FROM {table} WHERE user_id = ? AND {key} = ? AND type = ? AND category = ? "
+                          f"AND count <= 0", [(user_id,) + k for k in keyed])
+
+def _rebuild_rollups(c, user_id=None):
+    where = "" if user_id is None else " WHERE user_id = ?"
+    params = () if user_id is None else (user_id,)
+    for table, key, width in _ROLLUPS:
+        c.execute(f"DELETE FROM {table}{where}", params)
+        c.execute(f"INSERT INTO {table} (user_id, {key}, type, category, total, count) "
+                  f"SELECT user_id, substr(date, 1, {width}), type, category, SUM(amount), COUNT(*) "
+                  f"FROM transactions{where} GROUP BY user_id, substr(date, 1, {width}), type, category", params)
+
+# How many of the latest expenses (by date, id) recent_expenses keeps per user
+RECENT_EXPENSES = 30
+
+def _apply_to_expense_state(c, user_id, transaction_id, trans_type, category, amount, date, sign):
+    """Adds (sign=1) or removes (sign=-1) one transaction from expense_totals/recent_expenses."""
+    if trans_type != 'expense':
+        return
+    c.execute("INSERT INTO expense_totals (user_id, category, total, count) VALUES (?, ?, ?, ?) "
+              "ON CONFLICT(user_id, category) DO UPDATE SET "
+              "total = total + excluded.total, count = count + excluded.count",
+              (user_id, category, sign * float(amount), sign))
+    if sign > 0:
+        c.execute("INSERT INTO recent_expenses (user_id, date, id, category, amount) VALUES (?, ?, ?, ?, ?)",
+                  (user_id, date, transaction_id, category, amount))
+        _trim_recent_expenses(c, user_id)
+    else:
+        c.execute("DELETE FROM expense_totals WHERE user_id = ? AND category = ? AND count <= 0", (user_id, category))
+        c.execute("DELETE FROM recent_expenses WHERE user_id = ? AND date = ? AND id = ?", (user_id, date, transaction_id))
+        if c.rowcount:
+            _refill_recent_expenses(c, user_id)
+
+def _apply_many_to_expense_state(c, user_id, rows, sign, transaction_ids=()):
+    """
+    _apply_to_expense_state for many (type, category, amount, date) rows. Removals
+    pass the deleted transaction_ids; the recent buffer is then topped back up
+    from the transactions table in one query.
+    """
+    _apply_deltas_to_expense_state(c, user_id, _sum_deltas(rows, sign), sign, transaction_ids)
+
+def _apply_deltas_to_expense_state(c, user_id, deltas, sign, transaction_ids=()):
+    by_category = {}
+    for (_, trans_type, category), (total, count) in deltas.items():
+        if trans_type == 'expense':
+            previous_total, previous_count = by_category.get(category, (0.0, 0))
+            by_category[category] = (previous_total + total, previous_count + count)
+    c.executemany("INSERT INTO expense_totals (user_id, category, total, count) VALUES (?, ?, ?, ?) "
+                  "ON CONFLICT(user_id, category) DO UPDATE SET "
+                  "total = total + excluded.total, count = count + excluded.count",
+                  [(user_id, category, total, count) for category, (total, count) in by_category.items()])
+    if sign < 0:
+        c.executemany("DELETE FROM expense_totals WHERE user_id = ? AND category = ? AND count <= 0",
+                      [(user_id, category) for category in by_category])
+        c.executemany("DELETE FROM recent_expenses WHERE user_id = ? AND id = ?", [(user_id, i) for i in transaction_ids])
+    if by_category:
+        _refill_recent_expenses(c, user_id)
+        _trim_recent_expenses(c, user_id)
+
+def _trim_recent_expenses(c, user_id):
+    c.execute("DELETE FROM recent_expenses WHERE user_id = ? AND (date, id) < "
+              "(SELECT date, id FROM recent_expenses WHERE user_id = ? ORDER BY date DESC, id DESC LIMIT 1 OFFSET ?)",
+              (user_id, user_id, RECENT_EXPENSES - 1))
+
+def _refill_recent_expenses(c, user_id):
+    # The buffer always holds a suffix of the latest expenses, so re-inserting the latest ones fills any gap
+    c.execute("INSERT OR IGNORE INTO recent_expenses (user_id, date, id, category, amount) "
+              "SELECT user_id, date, id, category, amount FROM transactions WHERE user_id = ? AND type = 'expense' "
+              "ORDER BY date DESC, id DESC LIMIT ?", (user_id, RECENT_EXPENSES))
+
+def _rebuild_expense_state(c, user_id=None):
+    where = "" if user_id is None else " AND user_id = ?"
+    params = () if user_id is None else (user_id,)
+    c.execute(f"DELETE FROM expense_totals WHERE 1 = 1{where}", params)
+    c.execute(f"INSERT INTO expense_totals (user_id, category, total, count) "
+              f"SELECT user_id, category, SUM(amount), COUNT(*) FROM transactions "
+              f"WHERE type = 'expense'{where} GROUP BY user_id, category", params)
+    c.execute(f"DELETE FROM recent_expenses WHERE 1 = 1{where}", params)
+    c.execute(f"INSERT INTO recent_expenses (user_id, date, id, category, amount) "
+              f"SELECT user_id, date, id, category, amount FROM ("
+              f"SELECT user_id, date, id, category, amount, "
+              f"ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date DESC, id DESC) AS position "
+              f"FROM transactions WHERE type = 'expense'{where}) WHERE position <= ?", params + (RECENT_EXPENSES,))
+
+def get_expense_state(user_id):
+    """
+    ({category: (total, count)} over all expenses, [(category, amount)] of the
+    latest RECENT_EXPENSES expenses oldest first), as kept up to date on every write.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("SELECT category, total, count FROM expense_totals WHERE user_id = ? ORDER BY category", (user_id,))
+        totals = {r[0]: (r[1], r[2]) for r in c.fetchall()}
+        c.execute("SELECT category, amount FROM recent_expenses WHERE user_id = ? ORDER BY date, id", (user_id,))
+        return totals, c.fetchall()
+    finally:
+        release_connection(conn)
+
+def rebuild_rollups(user_id=None):
+    """
+    Recomputes daily_totals/monthly_totals and the expense state behind /analyze
+    from the transactions table, for one user or everyone. Used for backfill and
+    to repair drift.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        _rebuild_rollups(c, user_id)
+        _rebuild_expense_state(c, user_id)
+        _bump_data_version(c, user_id)
+        conn.commit()
+        logger.info(f"Rollups rebuilt for {'all users' if user_id is None else f'user_id={user_id}'}")
+        return True
+    except Exception as e:
+        logger.error(f"Error rebuilding rollups: {str(e)}")
+        return False
+    finally:
+        release_connection(conn)
+
+def get_daily_totals(user_id, start_date=None, end_date=None):
+    """Per (day, type, category) sums and counts from the daily rollup."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        query = "SELECT day, type, category, total, count FROM daily_totals WHERE user_id = ?"
+        params = [user_id]
+        if start_date:
+            query += " AND day >= ?"
+            params.append(str(start_date))
+        if end_date:
+            query += " AND day <= ?"
+            params.append(str(end_date))
+        c.execute(query, params)
+        return [{'day': r[0], 'type': r[1], 'category': r[2], 'total': r[3], 'count': r[4]} for r in c.fetchall()]
+    finally:
+        release_connection(conn)
+
+def get_monthly_totals(user_id, start_month=None, end_month=None):
+    """Per (month, type, category) sums and counts from the monthly rollup. Months are 'YYYY-MM'."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        query = "SELECT month, type, category, total, count FROM monthly_totals WHERE user_id = ?"
+        params = [user_id]
+        if start_month:
+            query += " AND month >= ?"
+            params.append(start_month)
+        if end_month:
+            query += " AND month <= ?"
+            params.append(end_month)
+        c.execute(query, params)
+        return [{'month': r[0], 'type': r[1], 'category': r[2], 'total': r[3], 'count': r[4]} for r in c.fetchall()]
+    finally:
+        release_connection(conn)
+
+def get_totals_by_type(user_id, start_date=None, end_date=None):
+    """Total amount per transaction type over an inclusive date range, e.g. {'income': 10.0, 'expense': 4.5}."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        query = "SELECT type, SUM(total) FROM daily_totals WHERE user_id = ?"
+        params = [user_id]
+        if start_date:
+            query += " AND day >= ?"
+            params.append(str(start_date))
+        if end_date:
+            query += " AND day <= ?"
+            params.append(str(end_date))
+        c.execute(query + " GROUP BY type", params)
+        return {row[0]: row[1] for row in c.fetchall()}
+    finally:
+        release_connection(conn)
+
+def get_totals_by_category(user_id, start_date=None, end_date=None, trans_type='expense'):
+    """Total amount per category of one transaction type over an inclusive date range."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        query = "SELECT category, SUM(total) FROM daily_totals WHERE user_id = ? AND type = ?"
+        params = [user_id, trans_type]
+        if start_date:
+            query += " AND day >= ?"
+            params.append(str(start_date))
+        if end_date:
+            query += " AND day <= ?"
+            params.append(str(end_date))
+        c.execute(query + " GROUP BY category", params)
+        return {row[0]: row[1] for row in c.fetchall()}
+    finally:
+        release_connection(conn)
+
+def compare_periods(user_id, periods, trans_type='expense'):
+    """
+    Totals and per-category breakdowns for several inclusive date ranges in a single
+    query. periods maps a label to (start_date, end_date); returns
+    {label: {'total': float, 'breakdown': {category: float}}}.
+    """
+    labels = list(periods)
+    if not labels:
+        return {}
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        columns = ", ".join("SUM(CASE WHEN day BETWEEN ? AND ? THEN total END)" for _ in labels)
+        params = []
+        for label in labels:
+            params.extend(str(d) for d in periods[label])
+        params.extend([user_id, trans_type,
+                       min(str(periods[label][0]) for label in labels),
+                       max(str(periods[label][1]) for label in labels)])
+        c.execute(f"SELECT category, {columns} FROM daily_totals "
+                  f"WHERE user_id = ? AND type = ? AND day >= ? AND day <= ? GROUP BY category", params)
+        result = {label: {'total': 0.0, 'breakdown': {}} for label in labels}
+        for row in c.fetchall():
+            for i, label in enumerate(labels):
+                if row[i + 1] is not None:
+                    result[label]['breakdown'][row[0]] = row[i + 1]
+                    result[label]['total'] += row[i + 1]
+        return result
+    finally:
+        release_connection(conn)
+
+def get_all_monthly_expenses():
+    """
+    Every user's monthly expense totals in one query, from the monthly rollup.
+    Returns (user_id, month, total, count) tuples ordered by user and month.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("SELECT user_id, month, SUM(total), SUM(count) FROM monthly_totals "
+                  "WHERE type = 'expense' GROUP BY user_id, month ORDER BY user_id, month")
+        return c.fetchall()
+    finally:
+        release_connection(conn)
+
+def get_expense_fingerprint(user_id):
+    """(total, count) of a user's expenses; compared against forecasts.expense_total/expense_count."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("SELECT COALESCE(SUM(total), 0), COALESCE(SUM(count), 0) FROM monthly_totals "
+                  "WHERE user_id = ? AND type = 'expense'", (user_id,))
+        total, count = c.fetchone()
+        return round(total, 2), count
+    finally:
+        release_connection(conn)
+
+def save_forecasts(rows):
+    """
+    rows: (user_id, next_month_exp, method, expense_total, expense_count) tuples,
+    written in one transaction. Bumps the data version of every user whose
+    forecast (or the expense totals it was computed from) changed, so cached
+    responses showing the old one are dropped.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        c.execute("SELECT user_id, next_month_exp, expense_total, expense_count FROM forecasts")
+        previous = {row[0]: row[1:] for row in c.fetchall()}
+        changed = [r[0] for r in rows if previous.get(r[0]) != (r[1], r[3], r[4])]
+        c.executemany("INSERT OR REPLACE INTO forecasts (user_id, next_month_exp, method, expense_total, expense_count, computed_at) "
+                      "VALUES (?, ?, ?, ?, ?, datetime('now'))", rows)
+        for user_id in changed:
+            _bump_data_version(c, user_id)
+        conn.commit()
+        logger.info(f"Saved {len(rows)} forecasts ({len(changed)} changed)")
+        return True
+    except Exception as e:
+        logger.error(f"Error saving forecasts: {str(e)}")
+        return False
+    finally:
+        release_connection(conn)
+
+def get_stored_forecast(user_id):
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("SELECT next_month_exp, method, expense_total, expense_count, computed_at FROM forecasts WHERE user_id = ?", (user_id,))
+        f = c.fetchone()
+        if not f:
+            return None
+        return {'next_month_exp': f[0], 'method': f[1], 'expense_total': f[2], 'expense_count': f[3], 'computed_at': f[4]}
+    except Exception as e:
+        logger.error(f"Error fetching stored forecast for user_id={user_id}: {str(e)}")
+        return None
+    finally:
+        release_connection(conn)
 
 def add_transaction(user_id, trans_type, category, amount, date, goal_id=0):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("INSERT INTO transactions (user_id, type, category, amount, date, goal_id) VALUES (?, ?, ?, ?, ?, ?)",
                   (user_id, trans_type, category, amount, date, goal_id))
+        transaction_id = c.lastrowid
+        _apply_to_rollups(c, user_id, trans_type, category, amount, date, 1)
+        _apply_to_expense_state(c, user_id, transaction_id, trans_type, category, amount, date, 1)
+        _bump_data_version(c, user_id)
         conn.commit()
+        bump_transactions_version(user_id)
         logger.info(f"Transaction added: user_id={user_id}, type={trans_type}, category={category}, amount={amount}, date={date}, goal_id={goal_id}")
         return True
     except Exception as e:
         logger.error(f"Error adding transaction for user_id {user_id}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
+
+def _insert_transactions(c, user_id, rows, contribute=True):
+    """
+    Inserts (type, category, amount, date, goal_id) rows with their rollup,
+    expense-state and (unless the caller already applied them) goal-progress
+    updates, inside the caller's transaction.
+    """
+    c.executemany("INSERT INTO transactions (user_id, type, category, amount, date, goal_id) VALUES (?, ?, ?, ?, ?, ?)",
+                  [(user_id, t, cat, amount, date, goal_id) for t, cat, amount, date, goal_id in rows])
+    _apply_many_to_rollups(c, user_id, [r[:4] for r in rows], 1)
+    _apply_many_to_expense_state(c, user_id, [r[:4] for r in rows], 1)
+    if not contribute:
+        return
+    contributions = {}
+    for _, _, amount, _, goal_id in rows:
+        if goal_id:
+            contributions[goal_id] = contributions.get(goal_id, 0) + amount
+    c.executemany("UPDATE goals SET current_amount = current_amount + ? WHERE id = ? AND user_id = ?",
+                  [(amount, goal_id, user_id) for goal_id, amount in contributions.items()])
+
+def add_transactions(user_id, rows):
+    """
+    Inserts many (type, category, amount, date, goal_id) rows in one transaction:
+    the rows, their rollup deltas and the progress of any goals they contribute to
+    are all committed together or not at all.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        _insert_transactions(c, user_id, rows)
+        _bump_data_version(c, user_id)
+        conn.commit()
+        bump_transactions_version(user_id)
+        logger.info(f"Transactions added: {len(rows)} rows for user_id={user_id}")
+        return True
+    except Exception as e:
+        logger.error(f"Error adding {len(rows)} transactions for user_id {user_id}: {str(e)}")
+        return False
+    finally:
+        release_connection(conn)
+
+def _contribute_to_next_goal(c, user_id, amount, today):
+    """
+    Adds a Savings income to the unfinished goal with the nearest deadline after
+    `today` in place, inside the caller's write transaction. Returns the goal
+    id, or 0 if there is none.
+    """
+    c.execute("SELECT id FROM goals WHERE user_id = ? AND deadline > ? AND current_amount < target_amount "
+              "ORDER BY deadline, id LIMIT 1", (user_id, today))
+    row = c.fetchone()
+    if row is None:
+        return 0
+    c.execute("UPDATE goals SET current_amount = current_amount + ? WHERE id = ? AND user_id = ?",
+              (amount, row[0], user_id))
+    return row[0]
+
+def _contribute_to_next_goals(c, user_id, amounts, today):
+    """
+    _contribute_to_next_goal for a run of Savings incomes, in order. Each amount
+    goes to the goal that query would pick after the previous ones were added
+    (the chosen goal stays first until it is reached), but each goal is selected
+    and written once per run instead of once per amount. Returns the goal id per
+    amount, 0 once no goal is left.
+    """
+    goal_ids = []
+    while len(goal_ids) < len(amounts):
+        c.execute("SELECT id, current_amount, target_amount FROM goals WHERE user_id = ? AND deadline > ? "
+                  "AND current_amount < target_amount ORDER BY deadline, id LIMIT 1", (user_id, today))
+        row = c.fetchone()
+        if row is None:
+            goal_ids.extend([0] * (len(amounts) - len(goal_ids)))
+            break
+        goal_id, current, target = row
+        while len(goal_ids) < len(amounts) and current < target:
+            # Same float additions, in the same order, as one UPDATE per amount
+            current += amounts[len(goal_ids)]
+            goal_ids.append(goal_id)
+        c.execute("UPDATE goals SET current_amount = ? WHERE id = ? AND user_id = ?", (current, goal_id, user_id))
+    return goal_ids
+
+def add_transactions_with_goals(user_id, rows, today=None):
+    """
+    Inserts (type, category, amount, date) rows and funds goals from Savings
+    income, all in one write transaction. Each Savings income goes to the goal
+    chosen by an indexed query that sees the previous rows' contributions, and
+    BEGIN IMMEDIATE takes the write lock before that choice, so concurrent
+    requests neither lose progress nor pick goals from stale amounts. Returns
+    the goal id per row (0 for none), or None on error.
+    """
+    today = (today or datetime.date.today()).isoformat()
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        goal_ids = []
+        for trans_type, category, amount, _ in rows:
+            goal_id = 0
+            if trans_type == 'income' and category == 'Savings':
+                goal_id = _contribute_to_next_goal(c, user_id, amount, today)
+            goal_ids.append(goal_id)
+        _insert_transactions(c, user_id, [tuple(row) + (goal_id,) for row, goal_id in zip(rows, goal_ids)],
+                             contribute=False)
+        _bump_data_version(c, user_id)
+        conn.commit()
+        bump_transactions_version(user_id)
+        logger.info(f"Transactions added: {len(rows)} rows for user_id={user_id}, "
+                    f"{sum(1 for g in goal_ids if g)} goal contributions")
+        return goal_ids
+    except Exception as e:
+        logger.error(f"Error adding {len(rows)} transactions for user_id {user_id}: {str(e)}")
+        return None
+    finally:
+        release_connection(conn)
+
+def import_transaction_chunks(user_id, chunks, today=None):
+    """
+    Bulk import: inserts every chunk of (type, category, amount, date) rows from
+    `chunks` in one write transaction. The rows are prepared (sorted by date, rollup
+    and expense-state deltas summed) before the write lock is taken, so callers
+    should pass already-parsed chunks; the lock then only covers funding goals,
+    the inserts, the rollups and the commit. Savings income funds goals in file
+    order through _contribute_to_next_goals, picking the same goals as
+    add_transactions_with_goals. Returns (rows written, {goal_id: amount
+    contributed}), or None on error, in which case nothing is written.
+    """
+    today = (today or datetime.date.today()).isoformat()
+    prepared = []
+    deltas = {}
+    for rows in chunks:
+        # Date order keeps inserts into the (user_id, date) indexes local; stable, so same-day rows keep file order
+        order = sorted(range(len(rows)), key=list(map(operator.itemgetter(3), rows)).__getitem__)
+        params = [(user_id,) + rows[i] + (0,) for i in order]
+        # Positions of the Savings income in params, back in file order for funding goals
+        savings = [p for p, row in enumerate(params) if row[2] == 'Savings' and row[1] == 'income']
+        savings.sort(key=order.__getitem__)
+        prepared.append((params, savings))
+        # Summed per day here (rows carry ISO dates) rather than through _sum_deltas, to stay out of a per-row loop
+        keys = list(zip(map(operator.itemgetter(3), rows), map(operator.itemgetter(0), rows),
+                        map(operator.itemgetter(1), rows)))
+        totals = collections.defaultdict(float)
+        for k, amount in zip(keys, map(operator.itemgetter(2), rows)):
+            totals[k] += amount
+        for k, count in collections.Counter(keys).items():
+            previous_total, previous_count = deltas.get(k, (0.0, 0))
+            deltas[k] = (previous_total + totals[k], previous_count + count)
+
+    conn = get_connection()
+    c = conn.cursor()
+    written = 0
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        contributions = {}
+        goals_left = True
+        for params, savings in prepared:
+            if goals_left and savings:
+                goal_ids = _contribute_to_next_goals(c, user_id, [params[p][3] for p in savings], today)
+                for p, goal_id in zip(savings, goal_ids):
+                    if goal_id:
+                        contributions[goal_id] = contributions.get(goal_id, 0) + params[p][3]
+                        params[p] = params[p][:5] + (goal_id,)
+                # Goals only fill up inside this transaction, so once none is left to fund none will be
+                goals_left = goal_ids[-1] != 0
+            c.executemany("INSERT INTO transactions (user_id, type, category, amount, date, goal_id) "
+                          "VALUES (?, ?, ?, ?, ?, ?)", params)
+            written += len(params)
+        _apply_deltas_to_rollups(c, user_id, deltas, 1)
+        _apply_deltas_to_expense_state(c, user_id, deltas, 1)
+        _bump_data_version(c, user_id)
+        conn.commit()
+        bump_transactions_version(user_id)
+        logger.info(f"Transactions imported: {written} rows for user_id={user_id}, "
+                    f"{len(contributions)} goals funded")
+        return written, contributions
+    except Exception as e:
+        logger.error(f"Error importing transactions for user_id {user_id} after {written} rows: {str(e)}")
+        return None
+    finally:
+        release_connection(conn)
 
 def delete_transaction(user_id, transaction_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
+        c.execute("SELECT type, category, amount, date FROM transactions WHERE id = ? AND user_id = ?", (transaction_id, user_id))
+        row = c.fetchone()
         c.execute("DELETE FROM transactions WHERE id = ? AND user_id = ?", (transaction_id, user_id))
         if c.rowcount == 0:
             logger.warning(f"No transaction found for id={transaction_id}, user_id={user_id}")
             return False
+        _apply_to_rollups(c, user_id, row[0], row[1], row[2], row[3], -1)
+        _apply_to_expense_state(c, user_id, transaction_id, row[0], row[1], row[2], row[3], -1)
+        _bump_data_version(c, user_id)
         conn.commit()
+        bump_transactions_version(user_id)
         logger.info(f"Transaction deleted: id={transaction_id}, user_id={user_id}")
         return True
     except Exception as e:
         logger.error(f"Error deleting transaction id={transaction_id} for user_id={user_id}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
+
+# Ids per statement in delete_transactions, under SQLite's default host-parameter limit
+DELETE_BATCH_SIZE = 500
+
+def delete_transactions(user_id, transaction_ids):
+    """
+    Deletes many of a user's transactions in one transaction, keeping the rollups
+    in step. Returns the ids that were actually deleted (others didn't exist or
+    belong to someone else), or None on error.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        ids = list(dict.fromkeys(int(i) for i in transaction_ids))
+        deleted = []
+        rows = []
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start:start + DELETE_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            c.execute(f"SELECT id, type, category, amount, date FROM transactions WHERE user_id = ? AND id IN ({placeholders})",
+                      [user_id] + batch)
+            found = c.fetchall()
+            c.executemany("DELETE FROM transactions WHERE id = ? AND user_id = ?", [(r[0], user_id) for r in found])
+            deleted.extend(r[0] for r in found)
+            rows.extend(r[1:] for r in found)
+        if rows:
+            _apply_many_to_rollups(c, user_id, rows, -1)
+            _apply_many_to_expense_state(c, user_id, rows, -1, deleted)
+            _bump_data_version(c, user_id)
+        conn.commit()
+        if deleted:
+            bump_transactions_version(user_id)
+        logger.info(f"Transactions deleted: {len(deleted)} of {len(ids)} requested for user_id={user_id}")
+        return deleted
+    except Exception as e:
+        logger.error(f"Error deleting transactions for user_id={user_id}: {str(e)}")
+        return None
+    finally:
+        release_connection(conn)
 
 def add_category(user_id, category):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("INSERT OR IGNORE INTO categories (user_id, category) VALUES (?, ?)", (user_id, category))
         if c.rowcount == 0:
             logger.warning(f"Category already exists: {category} for user_id={user_id}")
             return False
+        _bump_data_version(c, user_id)
         conn.commit()
         logger.info(f"Category added: {category} for user_id={user_id}")
         return True
@@ -151,24 +1093,46 @@ def add_category(user_id, category):
         logger.error(f"Error adding category {category} for user_id={user_id}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_categories(user_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("SELECT category FROM categories WHERE user_id = ? OR user_id = 0", (user_id,))
         categories = [row[0] for row in c.fetchall()]
-        logger.debug(f"Fetched categories: {categories} for user_id={user_id}")
+        payload_logger.debug("Fetched categories: %s for user_id=%s", categories, user_id)
         return categories
     except Exception as e:
         logger.error(f"Error fetching categories for user_id={user_id}: {str(e)}")
         return ['Food', 'Travel', 'Salary', 'Rent', 'Utilities', 'Shopping', 'Other']
     finally:
-        conn.close()
+        release_connection(conn)
 
-def get_transactions(user_id, start_date=None, end_date=None, category=None):
-    conn = sqlite3.connect('finance.db')
+TRANSACTION_COLUMNS = ('id', 'user_id', 'type', 'category', 'amount', 'date', 'goal_id')
+# Rows per fetchmany() when get_transactions reads into columns
+COLUMN_FETCH_SIZE = 10000
+
+def transactions_cursor(row):
+    """Keyset cursor for a transaction row: its (date, id) position in the listing order."""
+    return f"{row['date']},{row['id']}"
+
+def parse_transactions_cursor(cursor):
+    """(date, id) from transactions_cursor(); raises ValueError if malformed."""
+    date, sep, row_id = str(cursor).rpartition(',')
+    if not sep or not date:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return date, int(row_id)
+
+def get_transactions(user_id, start_date=None, end_date=None, category=None, after=None, limit=None, columns=False):
+    """
+    A user's transactions ordered by (date, id). `after` is a cursor from
+    transactions_cursor(); only rows past it are returned, at most `limit` of them.
+    With columns=True the result is {column: [values]} over TRANSACTION_COLUMNS
+    instead of a dict per row, read from the cursor in batches; for long histories
+    that is a fraction of the memory, and what prepare_data takes as is.
+    """
+    conn = get_connection()
     c = conn.cursor()
     try:
         query = """SELECT id, user_id, type, category, amount, date, goal_id 
@@ -185,31 +1149,65 @@ def get_transactions(user_id, start_date=None, end_date=None, category=None):
         if category:
             query += " AND category = ?"
             params.append(category)
+        if after:
+            after_date, after_id = parse_transactions_cursor(after)
+            # Row-value comparison lets SQLite seek the (user_id, date) index to the cursor
+            query += " AND (date, id) > (?, ?)"
+            params.extend([after_date, after_id])
+        query += " ORDER BY date, id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
 
         c.execute(query, params)
-        transactions = c.fetchall()
-        return [
-            {
-                'id': t[0],
-                'user_id': t[1],
-                'type': t[2],
-                'category': t[3],
-                'amount': t[4],
-                'date': t[5],
-                'goal_id': t[6]
-            }
-            for t in transactions
-        ]
+        if columns:
+            return _fetch_columns(c)
+        return [dict(zip(TRANSACTION_COLUMNS, t)) for t in c.fetchall()]
     finally:
-        conn.close()
+        release_connection(conn)
+
+# Columns with few distinct values; _fetch_columns keeps one object per value
+# instead of the new str/int sqlite3 creates for every row
+_REPEATED_COLUMNS = ('user_id', 'type', 'category', 'date')
+
+def _fetch_columns(c):
+    values = tuple([] for _ in TRANSACTION_COLUMNS)
+    memos = tuple({} if name in _REPEATED_COLUMNS else None for name in TRANSACTION_COLUMNS)
+    while True:
+        rows = c.fetchmany(COLUMN_FETCH_SIZE)
+        if not rows:
+            return dict(zip(TRANSACTION_COLUMNS, values))
+        for column, memo, batch in zip(values, memos, zip(*rows)):
+            column.extend(batch if memo is None else map(memo.setdefault, batch, batch))
+
+def get_transactions_page(user_id, start_date=None, end_date=None, category=None, after=None, limit=100):
+    """One page of get_transactions() plus the cursor for the next page (None on the last one)."""
+    rows = get_transactions(user_id, start_date, end_date, category, after=after, limit=limit + 1)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, transactions_cursor(rows[-1])
+    return rows, None
+
+def iter_transactions(user_id, start_date=None, end_date=None, category=None, after=None, batch_size=500):
+    """
+    Yields get_transactions() rows one keyset page at a time, so memory stays at
+    batch_size rows and no connection or read transaction is held between pages.
+    """
+    while True:
+        rows = get_transactions(user_id, start_date, end_date, category, after=after, limit=batch_size)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = transactions_cursor(rows[-1])
 
 
 def add_goal(user_id, goal_name, target_amount, deadline):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("INSERT INTO goals (user_id, goal_name, target_amount, current_amount, deadline) VALUES (?, ?, ?, 0, ?)",
                   (user_id, goal_name, target_amount, deadline))
+        _bump_data_version(c, user_id)
         conn.commit()
         logger.info(f"Goal added: {goal_name} for user {user_id}")
         return True
@@ -217,52 +1215,51 @@ def add_goal(user_id, goal_name, target_amount, deadline):
         logger.error(f"Error adding goal {goal_name} for user {user_id}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_goals(user_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("SELECT id, goal_name, target_amount, current_amount, deadline FROM goals WHERE user_id = ?", (user_id,))
         goals = c.fetchall()
-        logger.debug(f"Fetched {len(goals)} goals for user {user_id}")
+        logger.debug("Fetched %d goals for user %s", len(goals), user_id)
         return [{'id': g[0], 'goal_name': g[1], 'target_amount': g[2], 'current_amount': g[3], 'deadline': g[4]} for g in goals]
     except Exception as e:
         logger.error(f"Error fetching goals for user {user_id}: {str(e)}")
         return []
     finally:
-        conn.close()
+        release_connection(conn)
 
 def update_goal_progress(user_id, goal_id, amount):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
-        c.execute("SELECT current_amount FROM goals WHERE id = ? AND user_id = ?", (goal_id, user_id))
-        current_amount = c.fetchone()
-        if not current_amount:
+        # In place, so concurrent contributions can't overwrite each other
+        c.execute("UPDATE goals SET current_amount = current_amount + ? WHERE id = ? AND user_id = ?",
+                  (amount, goal_id, user_id))
+        if c.rowcount == 0:
             logger.warning(f"Goal not found for id={goal_id}, user_id={user_id}")
             return False
-        
-        new_amount = current_amount[0] + amount
-        
-        c.execute("UPDATE goals SET current_amount = ? WHERE id = ? AND user_id = ?", (new_amount, goal_id, user_id))
+        _bump_data_version(c, user_id)
         conn.commit()
-        logger.info(f"Goal progress updated for goal {goal_id} for user {user_id}. New amount: {new_amount}")
+        logger.info(f"Goal progress updated for goal {goal_id} for user {user_id}: +{amount}")
         return True
     except Exception as e:
         logger.error(f"Error updating goal progress for goal {goal_id} for user {user_id}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def delete_goal(user_id, goal_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("DELETE FROM goals WHERE id = ? AND user_id = ?", (goal_id, user_id))
         if c.rowcount == 0:
             logger.warning(f"No goal found for id={goal_id}, user_id={user_id}")
             return False
+        _bump_data_version(c, user_id)
         conn.commit()
         logger.info(f"Goal deleted: id={goal_id}, user_id={user_id}")
         return True
@@ -270,10 +1267,10 @@ def delete_goal(user_id, goal_id):
         logger.error(f"Error deleting goal id={goal_id} for user_id={user_id}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def update_goal(user_id, goal_id, goal_name, target_amount, deadline):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("UPDATE goals SET goal_name = ?, target_amount = ?, deadline = ? WHERE id = ? AND user_id = ?",
@@ -281,6 +1278,7 @@ def update_goal(user_id, goal_id, goal_name, target_amount, deadline):
         if c.rowcount == 0:
             logger.warning(f"No goal found or updated for id={goal_id}, user_id={user_id}")
             return False
+        _bump_data_version(c, user_id)
         conn.commit()
         logger.info(f"Goal updated: id={goal_id} for user {user_id}")
         return True
@@ -288,24 +1286,25 @@ def update_goal(user_id, goal_id, goal_name, target_amount, deadline):
         logger.error(f"Error updating goal id={goal_id} for user {user_id}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
         
 def add_debt(user_id, name, amount_owed, interest_rate, min_payment, due_date):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("INSERT INTO debts (user_id, name, amount_owed, interest_rate, min_payment, due_date) VALUES (?, ?, ?, ?, ?, ?)",
                   (user_id, name, amount_owed, interest_rate, min_payment, due_date))
+        _bump_data_version(c, user_id)
         conn.commit()
         return True
     except Exception as e:
         logger.error(f"Error adding debt: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_debts(user_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("SELECT id, name, amount_owed, interest_rate, min_payment, due_date FROM debts WHERE user_id = ?", (user_id,))
@@ -315,104 +1314,175 @@ def get_debts(user_id):
         logger.error(f"Error fetching debts: {str(e)}")
         return []
     finally:
-        conn.close()
+        release_connection(conn)
 
 def delete_debt(user_id, debt_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("DELETE FROM debts WHERE id = ? AND user_id = ?", (debt_id, user_id))
         if c.rowcount == 0:
             return False
+        _bump_data_version(c, user_id)
         conn.commit()
         return True
     except Exception as e:
         logger.error(f"Error deleting debt: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def pay_off_debt(user_id, debt_id, amount):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
-        c.execute("SELECT amount_owed FROM debts WHERE id = ? AND user_id = ?", (debt_id, user_id))
-        result = c.fetchone()
-        if not result:
+        # In place, so concurrent payments can't overwrite each other
+        c.execute("UPDATE debts SET amount_owed = MAX(0, amount_owed - ?) WHERE id = ? AND user_id = ?",
+                  (amount, debt_id, user_id))
+        if c.rowcount == 0:
             logger.warning(f"Debt not found for id={debt_id}, user_id={user_id}")
             return False
-        
-        current_amount_owed = result[0]
-        new_amount_owed = max(0, current_amount_owed - amount)
-        
-        c.execute("UPDATE debts SET amount_owed = ? WHERE id = ? AND user_id = ?", (new_amount_owed, debt_id, user_id))
+        _bump_data_version(c, user_id)
         conn.commit()
-        logger.info(f"Payment of {amount} made on debt {debt_id} for user {user_id}. New balance: {new_amount_owed}")
+        logger.info(f"Payment of {amount} made on debt {debt_id} for user {user_id}")
         return True
     except Exception as e:
         logger.error(f"Error making payment on debt {debt_id} for user {user_id}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def add_recurring_transaction(user_id, trans_type, category, amount, start_date, frequency):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
-        c.execute("INSERT INTO recurring_transactions (user_id, type, category, amount, start_date, frequency) VALUES (?, ?, ?, ?, ?, ?)",
-                  (user_id, trans_type, category, amount, start_date, frequency))
+        c.execute("INSERT INTO recurring_transactions (user_id, type, category, amount, start_date, frequency, next_due) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                  (user_id, trans_type, category, amount, start_date, frequency, start_date))
+        _bump_data_version(c, user_id)
         conn.commit()
         return True
     except Exception as e:
         logger.error(f"Error adding recurring transaction: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_recurring_transactions(user_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
-        c.execute("SELECT id, type, category, amount, start_date, frequency FROM recurring_transactions WHERE user_id = ?", (user_id,))
+        c.execute("SELECT id, type, category, amount, start_date, frequency, next_due, last_materialized "
+                  "FROM recurring_transactions WHERE user_id = ?", (user_id,))
         recurring_trans = c.fetchall()
-        return [{'id': t[0], 'type': t[1], 'category': t[2], 'amount': t[3], 'start_date': t[4], 'frequency': t[5]} for t in recurring_trans]
+        return [{'id': t[0], 'type': t[1], 'category': t[2], 'amount': t[3], 'start_date': t[4], 'frequency': t[5],
+                 'next_due': t[6], 'last_materialized': t[7]} for t in recurring_trans]
     except Exception as e:
         logger.error(f"Error fetching recurring transactions: {str(e)}")
         return []
     finally:
-        conn.close()
+        release_connection(conn)
+
+def get_due_recurring_transactions(today, after=None, limit=1000):
+    """
+    Rules of all users with next_due on or before `today`, in (next_due, id)
+    order from the next_due index. `after` is the (next_due, id) of the last
+    rule of the previous batch.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        query = ("SELECT id, user_id, type, category, amount, start_date, frequency, next_due "
+                 "FROM recurring_transactions WHERE next_due <= ?")
+        params = [today]
+        if after:
+            query += " AND (next_due, id) > (?, ?)"
+            params.extend(after)
+        query += " ORDER BY next_due, id LIMIT ?"
+        params.append(limit)
+        c.execute(query, params)
+        keys = ('id', 'user_id', 'type', 'category', 'amount', 'start_date', 'frequency', 'next_due')
+        return [dict(zip(keys, r)) for r in c.fetchall()]
+    finally:
+        release_connection(conn)
+
+def materialize_recurring(updates, today=None):
+    """
+    Applies (rule_id, user_id, expected_next_due, new_next_due, last_materialized,
+    rows) updates in one transaction, where rows are (type, category, amount,
+    date). A rule's rows are only written if its next_due is still
+    expected_next_due (compare-and-set), so concurrent runs never write an
+    occurrence twice. Savings income funds goals in rule order, chosen as of
+    `today` by _contribute_to_next_goals after BEGIN IMMEDIATE has taken the
+    write lock. Returns the number of transactions written, or None on error.
+    """
+    today = (today or datetime.date.today()).isoformat()
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        rows_by_user = {}
+        changed_users = set()
+        for rule_id, user_id, expected, next_due, last_materialized, rows in updates:
+            c.execute("UPDATE recurring_transactions SET next_due = ?, "
+                      "last_materialized = COALESCE(?, last_materialized) WHERE id = ? AND next_due = ?",
+                      (next_due, last_materialized, rule_id, expected))
+            if c.rowcount:
+                changed_users.add(user_id)
+                if rows:
+                    rows_by_user.setdefault(user_id, []).extend(rows)
+        for user_id, rows in rows_by_user.items():
+            savings = [i for i, row in enumerate(rows) if row[0] == 'income' and row[1] == 'Savings']
+            goal_ids = [0] * len(rows)
+            for i, goal_id in zip(savings, _contribute_to_next_goals(c, user_id, [rows[i][2] for i in savings], today)):
+                goal_ids[i] = goal_id
+            _insert_transactions(c, user_id, [tuple(row) + (goal_id,) for row, goal_id in zip(rows, goal_ids)],
+                                 contribute=False)
+        for user_id in changed_users:
+            _bump_data_version(c, user_id)
+        conn.commit()
+        for user_id in rows_by_user:
+            bump_transactions_version(user_id)
+        return sum(len(rows) for rows in rows_by_user.values())
+    except Exception as e:
+        logger.error(f"Error materializing recurring transactions: {str(e)}")
+        return None
+    finally:
+        release_connection(conn)
 
 def delete_recurring_transaction(user_id, trans_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("DELETE FROM recurring_transactions WHERE id = ? AND user_id = ?", (trans_id, user_id))
         if c.rowcount == 0:
             return False
+        _bump_data_version(c, user_id)
         conn.commit()
         return True
     except Exception as e:
         logger.error(f"Error deleting recurring transaction: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
         
 def add_asset(user_id, name, type, current_value):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("INSERT INTO assets (user_id, name, type, current_value) VALUES (?, ?, ?, ?)",
                   (user_id, name, type, current_value))
+        _bump_data_version(c, user_id)
         conn.commit()
         return True
     except Exception as e:
         logger.error(f"Error adding asset: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_assets(user_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("SELECT id, name, type, current_value FROM assets WHERE user_id = ?", (user_id,))
@@ -422,71 +1492,78 @@ def get_assets(user_id):
         logger.error(f"Error fetching assets: {str(e)}")
         return []
     finally:
-        conn.close()
+        release_connection(conn)
 
 def delete_asset(user_id, asset_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("DELETE FROM assets WHERE id = ? AND user_id = ?", (asset_id, user_id))
         if c.rowcount == 0:
             return False
+        _bump_data_version(c, user_id)
         conn.commit()
         return True
     except Exception as e:
         logger.error(f"Error deleting asset: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def update_asset(user_id, asset_id, name, asset_type, current_value):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("UPDATE assets SET name = ?, type = ?, current_value = ? WHERE id = ? AND user_id = ?",
                   (name, asset_type, current_value, asset_id, user_id))
         if c.rowcount == 0:
             return False
+        _bump_data_version(c, user_id)
         conn.commit()
         return True
     except Exception as e:
         logger.error(f"Error updating asset: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
         
         
 # database.py
 def update_budget(user_id, category, amount, alert_enabled=False):
-    conn = sqlite3.connect('finance.db')
+    return update_budgets(user_id, [(category, amount, alert_enabled)])
+
+def update_budgets(user_id, budgets):
+    """Upserts many (category, amount, alert_enabled) budgets in one transaction."""
+    conn = get_connection()
     c = conn.cursor()
     try:
-        c.execute(
+        c.executemany(
             "INSERT INTO budgets (user_id, category, amount, alert_enabled) VALUES (?, ?, ?, ?) "
-            "ON CONFLICT(user_id, category) UPDATE SET amount = ?, alert_enabled = ?",
-            (user_id, category, amount, alert_enabled, amount, alert_enabled)
+            "ON CONFLICT(user_id, category) DO UPDATE SET amount = excluded.amount, alert_enabled = excluded.alert_enabled",
+            [(user_id, category, amount, alert_enabled) for category, amount, alert_enabled in budgets]
         )
+        _bump_data_version(c, user_id)
         conn.commit()
-        logger.info(f"Budget updated: user_id={user_id}, category={category}, amount={amount}, alert_enabled={alert_enabled}")
+        logger.info(f"Budgets updated: user_id={user_id}, categories={[b[0] for b in budgets]}")
         return True
     except Exception as e:
-        logger.error(f"Error updating budget for user_id={user_id}, category={category}: {str(e)}")
+        logger.error(f"Error updating budgets for user_id={user_id}: {str(e)}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
         
         
 # database.py
 def get_budgets(user_id):
-    conn = sqlite3.connect('finance.db')
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("SELECT category, amount, alert_enabled FROM budgets WHERE user_id = ?", (user_id,))
         budgets = c.fetchall()
-        logger.debug(f"Fetched {len(budgets)} budgets for user_id={user_id}")
+        logger.debug("Fetched %d budgets for user_id=%s", len(budgets), user_id)
         return {row[0]: {'amount': row[1], 'alert_enabled': row[2]} for row in budgets}
     except Exception as e:
         logger.error(f"Error fetching budgets for user_id={user_id}: {str(e)}")
         return {}
     finally:
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
@@ -0,0 +1,77 @@
+import datetime
+import functools
+import zlib
+from flask import make_response, request, Response
+from flask_login import current_user
+import database
+from cache import LRUCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Conditional-GET and body caching for read-only, per-user endpoints. A response is
+# identified by the user's data version (database.get_data_version, bumped by every
+# write), today's date (several views depend on it) and the request URL, so nothing
+# ever needs invalidating: a write simply makes the old entries unreachable.
+
+MAX_AGE = 0
+
+# (user_id, version, day, full_path) -> (body bytes, mimetype)
+_body_cache = LRUCache(max_size=4096, max_weight=32 * 1024 * 1024, weigher=lambda entry: len(entry[0]))
+
+def configure(max_entries=None, max_bytes=None, max_age=None):
+    global MAX_AGE
+    if max_entries is not None:
+        _body_cache.max_size = int(max_entries)
+    if max_bytes is not None:
+        _body_cache.max_weight = int(max_bytes)
+    if max_age is not None:
+        MAX_AGE = int(max_age)
+
+def stats():
+    return {'entries': len(_body_cache), 'bytes': _body_cache.weight,
+            'hits': _body_cache.hits, 'misses': _body_cache.misses}
+
+def _set_cache_headers(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"private, max-age={MAX_AGE}" if MAX_AGE > 0 else "private, no-cache"
+    response.vary.add('Cookie')
+    return response
+
+def cached_response(view):
+    """
+    Serves a login_required GET view from the body cache and answers If-None-Match
+    with 304 while the user's data is unchanged. Only 200 responses are cached;
+    a view can opt a response out by setting Cache-Control: no-store on it. Views
+    must build the body from data keyed on the same persisted version (the
+    default, see database.SHARED_VERSIONS); a body whose version moved while it
+    was built is sent but not cached or tagged.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = int(current_user.id)
+        day = datetime.date.today().isoformat()
+        version = database.get_data_version(user_id)
+        # Deterministic, so any process can answer a revalidation without the body
+        etag = f"{user_id}-{version}-{day}-{zlib.crc32(request.full_path.encode()):08x}"
+        # Weak comparison (as RFC 9110 specifies for If-None-Match): compressed
+        # responses carry the same tag marked weak
+        if request.if_none_match.contains_weak(etag):
+            return _set_cache_headers(Response(status=304), etag)
+
+        key = (user_id, version, day, request.full_path)
+        cached = _body_cache.get(key)
+        if cached is not None:
+            return _set_cache_headers(Response(cached[0], mimetype=cached[1]), etag)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.cache_control.no_store or response.is_streamed:
+            return response
+        if database.get_data_version(user_id) != version:
+            # A write (from any process) landed while the view ran, so the body may
+            # reflect either version; don't let it answer for the one in the key
+            response.headers['Cache-Control'] = "private, no-cache"
+            return response
+        _body_cache.set(key, (response.get_data(), response.mimetype))
+        return _set_cache_headers(response, etag)
+    return wrapper
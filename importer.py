@@ -0,0 +1,258 @@
+import csv
+import datetime
+import functools
+import io
+import itertools
+import operator
+import re
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bulk import of bank statements / exported histories. Files are read as a stream
+# and normalized IMPORT_CHUNK_SIZE rows at a time (CSV column by column); once the
+# whole file is parsed the chunks are written by database.import_transaction_chunks:
+# one executemany per chunk, with rollups, expense state and the commit done once
+# per import, so the write lock isn't held while parsing.
+
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_MAX_ROWS = 1_000_000
+MAX_REPORTED_ERRORS = 50
+
+# Accepted header names (lower-cased) for each field
+COLUMN_ALIASES = {
+    'date': ('date', 'transaction date', 'posted date', 'posting date', 'value date', 'txn date'),
+    'type': ('type', 'transaction type'),
+    'category': ('category',),
+    'amount': ('amount', 'transaction amount'),
+    'debit': ('debit', 'withdrawal', 'withdrawals', 'withdrawal amount'),
+    'credit': ('credit', 'deposit', 'deposits', 'deposit amount'),
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%d %b %Y', '%Y%m%d')
+
+def read_csv(lines, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Yields (fields, line numbers, rows) batches of up to chunk_size rows from a
+    CSV with a header row: fields holds each column's field name (None for
+    columns that aren't imported), rows the value lists. Empty lines are dropped.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    lookup = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    fields = [lookup.get(name.strip().lower()) for name in header]
+    if 'date' not in fields or not ({'amount', 'debit', 'credit'} & set(fields)):
+        raise ValueError(f"CSV header needs a date column and an amount (or debit/credit) column, got {header}")
+    line_nos, records = [], []
+    for values in reader:
+        if values:
+            line_nos.append(reader.line_num)
+            records.append(values)
+            if len(records) == chunk_size:
+                yield fields, line_nos, records
+                line_nos, records = [], []
+    if records:
+        yield fields, line_nos, records
+
+_OFX_TAG = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+def read_ofx(lines):
+    """
+    Yields (line number, row dict) for each <STMTTRN> of an OFX statement, in the
+    same shape as read_csv. Handles both SGML (unclosed tags) and XML OFX.
+    """
+    current = None
+    for line_no, line in enumerate(lines, 1):
+        for tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                current = {'line': line_no}
+            elif current is not None:
+                if tag == 'DTPOSTED':
+                    current['date'] = value.strip()[:8]
+                elif tag == 'TRNAMT':
+                    current['amount'] = value.strip()
+                elif tag == 'TRNTYPE':
+                    current['ofx_type'] = value.strip().upper()
+        if current is not None and re.search(r'</STMTTRN>', line, re.IGNORECASE):
+            yield current.pop('line'), current
+            current = None
+
+@functools.lru_cache(maxsize=8192)
+def parse_date(value):
+    """ISO 'YYYY-MM-DD' from any of DATE_FORMATS. Cached: statements repeat a few thousand dates at most."""
+    value = value.strip()
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognized date {value!r}")
+
+def parse_amount(value):
+    value = (value or '').strip().replace(',', '').replace('₹', '').replace('$', '')
+    if value.startswith('(') and value.endswith(')'):
+        value = '-' + value[1:-1]
+    return float(value) if value else 0.0
+
+_strip_commas = operator.methodcaller('replace', ',', '')
+
+def _fast_amount(value):
+    """parse_amount of a plain number (thousands separators allowed), None for anything else."""
+    try:
+        return float(value.replace(',', '') or 0)
+    except ValueError:
+        return None
+
+@functools.lru_cache(maxsize=8192)
+def _fast_date(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+def normalize_row(row):
+    """
+    (type, category, amount, date) from a row dict keyed by field name. Without a
+    type column the sign decides (negative or debit is an expense); amounts are
+    stored positive. Raises ValueError for rows that can't be imported.
+    """
+    date = parse_date(row.get('date') or '')
+    if 'debit' in row or 'credit' in row:
+        amount = parse_amount(row.get('credit')) - parse_amount(row.get('debit'))
+    else:
+        amount = parse_amount(row.get('amount'))
+    trans_type = (row.get('type') or '').strip().lower()
+    if not trans_type:
+        trans_type = 'expense' if amount < 0 or row.get('ofx_type') == 'DEBIT' else 'income'
+    elif trans_type not in ('income', 'expense'):
+        raise ValueError(f"Unknown type {row.get('type')!r}")
+    amount = abs(amount)
+    if amount == 0:
+        raise ValueError("Zero amount")
+    category = (row.get('category') or '').strip() or 'Other'
+    return trans_type, category, round(amount, 2), date
+
+def normalize_rows(batch):
+    """normalize_row over [(line number, row dict)]: (rows, [(line number, message)])."""
+    rows, errors = [], []
+    for line_no, row in batch:
+        try:
+            rows.append(normalize_row(row))
+        except ValueError as e:
+            errors.append((line_no, str(e)))
+    return rows, errors
+
+def normalize_csv_rows(fields, line_nos, records):
+    """
+    normalize_rows for a read_csv batch, done a column at a time: dates and
+    amounts are parsed with map() over whole columns (dates cached per distinct
+    string) and the row tuples built in one comprehension. Rows the fast path
+    can't take (bad or unusual values, short rows) go through normalize_row, so
+    the results and error messages are the same.
+    """
+    index = {field: i for i, field in enumerate(fields) if field}
+    n = len(records)
+    ragged = min(map(len, records)) < len(fields)
+    if ragged:
+        padded = list(itertools.zip_longest(*records, fillvalue=''))
+
+    def column(field):
+        # Only the imported columns are pulled out; statements often carry many more
+        return padded[index[field]] if ragged else list(map(operator.itemgetter(index[field]), records))
+
+    def amounts(field):
+        if field not in index:
+            return itertools.repeat(0.0, n)
+        values = column(field)
+        try:
+            # Whole column in C when every value is a plain number
+            return list(map(float, map(_strip_commas, values)))
+        except ValueError:
+            return list(map(_fast_amount, values))
+
+    dates = map(_fast_date, column('date'))
+    if 'debit' in index or 'credit' in index:
+        signed = [None if credit is None or debit is None else credit - debit
+                  for credit, debit in zip(amounts('credit'), amounts('debit'))]
+    else:
+        signed = amounts('amount')
+    types = [t.strip().lower() for t in column('type')] if 'type' in index else [''] * n
+    categories = ([c.strip() or 'Other' for c in column('category')] if 'category' in index
+                  else itertools.repeat('Other', n))
+
+    # None marks the rows left to normalize_row
+    rows = [(trans_type or ('expense' if amount < 0 else 'income'), category, round(abs(amount), 2), date)
+            if date is not None and amount else None
+            for date, amount, trans_type, category in zip(dates, signed, types, categories)]
+    if ragged or not set(types) <= {'', 'income', 'expense'}:
+        for i, (record, trans_type) in enumerate(zip(records, types)):
+            if trans_type not in ('', 'income', 'expense') or len(record) < len(fields):
+                rows[i] = None
+    if None not in rows:
+        return rows, []
+    errors = []
+    for i, row in enumerate(rows):
+        if row is None and any(v.strip() for v in records[i]):
+            try:
+                rows[i] = normalize_row({f: v for f, v in zip(fields, records[i]) if f})
+            except ValueError as e:
+                errors.append((line_nos[i], str(e)))
+    return [row for row in rows if row is not None], errors
+
+def open_text(stream):
+    """Text lines from a binary upload/file stream (BOM-tolerant UTF-8)."""
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+def detect_format(filename):
+    return 'ofx' if str(filename or '').lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+def import_transactions(user_id, lines, fmt='csv', chunk_size=IMPORT_CHUNK_SIZE, max_rows=IMPORT_MAX_ROWS):
+    """
+    Imports a CSV or OFX statement for a user in one write transaction (see
+    database.import_transaction_chunks): all of it or, if the write fails,
+    nothing. The file is parsed in full before that transaction starts, so it may
+    hold at most max_rows valid rows (ValueError otherwise, as for an unreadable
+    file). Invalid rows are skipped and reported; Savings income is assigned to
+    goals exactly as /add_transaction does. Returns a stats dict.
+    """
+    import database  # Import here to avoid circular imports
+    start = time.perf_counter()
+    stats = {'imported': 0, 'skipped': 0, 'errors': [], 'goal_contributions': {}}
+
+    if fmt == 'ofx':
+        rows = read_ofx(lines)
+        batches = (normalize_rows(batch) for batch in iter(lambda: list(itertools.islice(rows, chunk_size)), []))
+    else:
+        batches = (normalize_csv_rows(*batch) for batch in read_csv(lines, chunk_size))
+    chunks = []
+    parsed = 0
+    for chunk, errors in batches:
+        stats['skipped'] += len(errors)
+        for line_no, message in errors[:MAX_REPORTED_ERRORS - len(stats['errors'])]:
+            stats['errors'].append({'line': line_no, 'message': message})
+        parsed += len(chunk)
+        if parsed > max_rows:
+            raise ValueError(f"File has more than {max_rows} transactions; split it into smaller imports")
+        if chunk:
+            chunks.append(chunk)
+
+    result = database.import_transaction_chunks(user_id, chunks)
+    if result is None:
+        stats['status'] = 'error'
+        stats['message'] = "Failed to write the imported rows, nothing was imported"
+    else:
+        stats['status'] = 'success'
+        stats['imported'], stats['goal_contributions'] = result
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    stats['rows_per_sec'] = round(stats['imported'] / stats['seconds']) if stats['seconds'] else stats['imported']
+    logger.info(f"Imported {stats['imported']} transactions for user {user_id} "
+                f"({stats['skipped']} skipped, {stats['rows_per_sec']} rows/sec)")
+    return stats
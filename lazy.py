@@ -0,0 +1,84 @@
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LazyModule:
+    """
+    Stand-in for a heavy module (pandas, numpy, ...) that is only imported on
+    first attribute access, so routes that never touch it don't pay for it.
+
+        pd = LazyModule('pandas')
+        pd.DataFrame(...)   # pandas is imported here
+    """
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+                    logger.debug("Lazily imported %s", self.__dict__['_name'])
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+def measure_import_times(module='app', deferred=(), path=None):
+    """
+    Imports `module` in a fresh interpreter with -X importtime, then each of the
+    `deferred` modules (the ones normally loaded lazily on first use). Returns
+    (total_us, direct, deferred_costs): the module's cumulative import time, the
+    cumulative time of each module it imports directly (slowest first), and the
+    extra time each deferred module costs on top. `path` is prepended to
+    PYTHONPATH so the module can be found.
+    """
+    code = "; ".join(f"import {m}" for m in (module,) + tuple(deferred))
+    env = dict(os.environ)
+    if path:
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (path, env.get('PYTHONPATH')) if p)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total = 0
+    direct = []
+    deferred_costs = {name: 0 for name in deferred}
+    children = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        depth = len(indent) // 2
+        # -X importtime prints children before their parent
+        if depth == 1:
+            children.append((name, int(cumulative)))
+        elif depth == 0:
+            if name == module:
+                total = int(cumulative)
+                direct = sorted(children, key=lambda item: item[1], reverse=True)
+            elif name in deferred_costs:
+                deferred_costs[name] = int(cumulative)
+            children = []
+    return total, direct, sorted(deferred_costs.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,108 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+logger = logging.getLogger(__name__)
+
+# Logging for the app process. Records are handed to a QueueHandler and written by
+# a QueueListener thread, so a slow terminal or disk never stalls a request. Levels
+# are set per logger (LOG_LEVELS, e.g. {'database': 'DEBUG'}), and request/response
+# payloads go to '<module>.payload' loggers whose DEBUG records are sampled.
+#
+# Log with %-style arguments, not f-strings: logger.debug("Budget: %s", rec) only
+# formats rec when the record is actually emitted.
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+PAYLOAD_SAMPLE_RATE = 0.01
+
+_listener = None
+_queue_handler = None
+
+class PayloadSampler(logging.Filter):
+    """
+    Passes about `rate` of the DEBUG records from '*.payload' loggers; everything
+    else goes through untouched.
+    """
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or not record.name.endswith('.payload'):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra= fields."""
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+                 'message': record.getMessage()}
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level='INFO', levels=None, payload_sample_rate=PAYLOAD_SAMPLE_RATE, fmt='text',
+                      use_queue=True, stream=None):
+    """
+    (Re)configures the root logger: `level` for everything, `levels` overrides per
+    logger name, output as 'text' or 'json' lines to `stream` (stderr by default).
+    With use_queue the caller only enqueues the record; a listener thread formats
+    and writes it. Replaces any handlers set up before (e.g. by basicConfig).
+    """
+    global _listener, _queue_handler
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(StructuredFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    if use_queue:
+        # Unbounded, so put() never blocks the thread that logs
+        records = queue.SimpleQueue()
+        front = _queue_handler = logging.handlers.QueueHandler(records)
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+    else:
+        front = output
+    front.addFilter(PayloadSampler(payload_sample_rate))
+    root.addHandler(front)
+    root.setLevel(level)
+    for name, module_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+    logger.debug("Logging configured: level=%s, levels=%s, format=%s, queue=%s", level, levels, fmt, use_queue)
+
+def stop_logging():
+    """Flushes and stops the queue listener, if one is running."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
+
+def _after_fork():
+    # Forked children don't get the listener thread; have them write directly
+    global _listener, _queue_handler
+    if _queue_handler is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    for output in _listener.handlers:
+        for f in _queue_handler.filters:
+            output.addFilter(f)
+        root.addHandler(output)
+    _listener = _queue_handler = None
+
+atexit.register(stop_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
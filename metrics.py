@@ -0,0 +1,278 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# In-process instrumentation: wall-clock timers around database.py / ml_models
+# functions (see instrument()), SQL statement and row counts from database's
+# cursors, and per-endpoint request totals. Everything is aggregated in memory and
+# rendered in the Prometheus text format by render(); a request's own breakdown
+# can also be sent back as a Server-Timing header.
+#
+# Inside a request, counts go to a RequestStats in a context variable and are
+# merged into the process totals once, when the request finishes, so a timed call
+# costs two perf_counter() calls and a few dict updates and takes no lock.
+
+ENABLED = True
+
+# Request duration histogram buckets (seconds)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Functions listed in a Server-Timing header, slowest first
+SERVER_TIMING_ENTRIES = 15
+
+BACKGROUND = 'background'
+
+class RequestStats:
+    """Counts for one request, kept in a context variable while it runs."""
+    __slots__ = ('start', 'queries', 'rows', 'timers', 'groups', 'active', 'token', 'finished')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.rows = 0
+        self.timers = {}   # function name -> [calls, seconds]
+        self.groups = {}   # group -> seconds spent in its outermost calls
+        self.active = set()
+        self.token = None
+        self.finished = False
+
+_current = contextvars.ContextVar('metrics_request', default=None)
+_lock = threading.Lock()
+# function name -> [calls, seconds]
+_timers = {}
+# (endpoint, method, status) -> requests
+_requests = {}
+# endpoint -> [bucket counts..., count, sum, queries, rows]
+_endpoints = {}
+# name -> (help, callable returning a number)
+_gauges = {}
+
+def _after_fork():
+    # A forked child (e.g. a server forking workers after import) may run timed
+    # functions; never inherit a lock some other thread held at fork time, or its counts
+    global _lock
+    _lock = threading.Lock()
+    _timers.clear()
+    _requests.clear()
+    _endpoints.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def configure(enabled=None):
+    global ENABLED
+    if enabled is not None:
+        ENABLED = bool(enabled)
+
+def _timed(func, name, group):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with _lock:
+                    entry = _timers.setdefault(name, [0, 0.0])
+                    entry[0] += 1
+                    entry[1] += elapsed
+        # Only the outermost call of a group counts towards the group's total,
+        # so update_budget -> update_budgets isn't counted twice as database time
+        outermost = group not in stats.active
+        if outermost:
+            stats.active.add(group)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if outermost:
+                stats.active.discard(group)
+                stats.groups[group] = stats.groups.get(group, 0.0) + elapsed
+            entry = stats.timers.get(name)
+            if entry is None:
+                stats.timers[name] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+    wrapper.__wrapped_timer__ = name
+    return wrapper
+
+def instrument(module, group=None, exclude=()):
+    """
+    Replaces every public function defined in `module` with a timed wrapper named
+    '<module>.<function>'; Server-Timing sums them under `group` ('db', 'ml').
+    Callers that look functions up on the module (or import them inside a
+    function, as ml_models does) get the timed version; calls within the module
+    go through it too, so timings are inclusive. Generator functions are left
+    alone, their work happens after the call returns. Returns the names instrumented.
+    """
+    group = group or module.__name__
+    names = []
+    for attr, func in list(vars(module).items()):
+        if (attr.startswith('_') or attr in exclude or not inspect.isfunction(func)
+                or func.__module__ != module.__name__ or inspect.isgeneratorfunction(func)
+                or hasattr(func, '__wrapped_timer__')):
+            continue
+        setattr(module, attr, _timed(func, f"{module.__name__}.{attr}", group))
+        names.append(attr)
+    logger.debug("Instrumented %d functions in %s", len(names), module.__name__)
+    return names
+
+def count_query():
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        return
+    with _lock:
+        entry = _endpoints.get(BACKGROUND) or _new_endpoint(BACKGROUND)
+        entry[-2] += 1
+
+def count_rows(n):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += n
+        return
+    with _lock:
+        entry = _endpoints.get(BACKGROUND) or _new_endpoint(BACKGROUND)
+        entry[-1] += n
+
+def _new_endpoint(endpoint):
+    # Caller holds _lock
+    entry = _endpoints[endpoint] = [0] * (len(REQUEST_BUCKETS) + 1) + [0.0, 0, 0]
+    return entry
+
+def gauge(name, help_text, fn):
+    """Registers a gauge whose value is read from fn() at scrape time."""
+    _gauges[name] = (help_text, fn)
+
+def begin_request():
+    if not ENABLED:
+        return None
+    stats = RequestStats()
+    stats.token = _current.set(stats)
+    return stats
+
+def finish_request(endpoint, method, status):
+    """
+    Merges the current request's counts into the process totals. Returns its
+    RequestStats (None outside an instrumented request, or if already finished).
+    """
+    stats = _current.get()
+    if stats is None or stats.finished:
+        return None
+    stats.finished = True
+    elapsed = time.perf_counter() - stats.start
+    endpoint = endpoint or 'unmatched'
+    with _lock:
+        key = (endpoint, method, str(status))
+        _requests[key] = _requests.get(key, 0) + 1
+        entry = _endpoints.get(endpoint) or _new_endpoint(endpoint)
+        entry[bisect.bisect_left(REQUEST_BUCKETS, elapsed)] += 1
+        entry[-4] += 1
+        entry[-3] += elapsed
+        entry[-2] += stats.queries
+        entry[-1] += stats.rows
+        for name, (calls, seconds) in stats.timers.items():
+            total = _timers.setdefault(name, [0, 0.0])
+            total[0] += calls
+            total[1] += seconds
+    return stats
+
+def end_request(endpoint=None, method=None):
+    """
+    Detaches the request's stats. Called from teardown, so it also runs when the
+    view raised and finish_request never did; those requests count as 500s.
+    """
+    stats = _current.get()
+    if stats is None:
+        return
+    if not stats.finished:
+        finish_request(endpoint, method, 500)
+    if stats.token is not None:
+        try:
+            _current.reset(stats.token)
+        except ValueError:
+            # Reset from a different context than begin_request ran in
+            _current.set(None)
+
+def server_timing(stats):
+    """Server-Timing header value for a finished request's stats."""
+    total = time.perf_counter() - stats.start
+    parts = [f"total;dur={total * 1000:.2f}"]
+    for group, seconds in sorted(stats.groups.items()):
+        desc = f"{stats.queries} queries, {stats.rows} rows" if group == 'db' else ''
+        parts.append(f"{group};dur={seconds * 1000:.2f}" + (f';desc="{desc}"' if desc else ''))
+    slowest = sorted(stats.timers.items(), key=lambda item: -item[1][1])[:SERVER_TIMING_ENTRIES]
+    for name, (calls, seconds) in slowest:
+        parts.append(f'{name};dur={seconds * 1000:.2f};desc="{calls}x"')
+    return ', '.join(parts)
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        timers = {k: list(v) for k, v in _timers.items()}
+        requests = dict(_requests)
+        endpoints = {k: list(v) for k, v in _endpoints.items()}
+    lines = [
+        '# HELP finance_function_seconds Time spent in instrumented database and analytics functions.',
+        '# TYPE finance_function_seconds summary',
+    ]
+    for name in sorted(timers):
+        calls, seconds = timers[name]
+        lines.append(f'finance_function_seconds_count{{function="{_label(name)}"}} {calls}')
+        lines.append(f'finance_function_seconds_sum{{function="{_label(name)}"}} {seconds:.6f}')
+
+    lines += ['# HELP finance_http_requests_total HTTP requests by endpoint, method and status.',
+              '# TYPE finance_http_requests_total counter']
+    for (endpoint, method, status), count in sorted(requests.items(), key=lambda item: tuple(map(str, item[0]))):
+        lines.append(f'finance_http_requests_total{{endpoint="{_label(endpoint)}",method="{_label(method)}",'
+                     f'status="{_label(status)}"}} {count}')
+
+    lines += ['# HELP finance_http_request_duration_seconds Request wall time by endpoint.',
+              '# TYPE finance_http_request_duration_seconds histogram']
+    for endpoint in sorted(endpoints):
+        entry = endpoints[endpoint]
+        if endpoint == BACKGROUND:
+            continue
+        label = _label(endpoint)
+        cumulative = 0
+        for bound, count in zip(REQUEST_BUCKETS, entry):
+            cumulative += count
+            lines.append(f'finance_http_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'finance_http_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {entry[-4]}')
+        lines.append(f'finance_http_request_duration_seconds_count{{endpoint="{label}"}} {entry[-4]}')
+        lines.append(f'finance_http_request_duration_seconds_sum{{endpoint="{label}"}} {entry[-3]:.6f}')
+
+    for metric, index, help_text in [('finance_db_queries_total', -2, 'SQL statements executed'),
+                                     ('finance_db_rows_total', -1, 'Rows fetched from SQL queries')]:
+        lines += [f'# HELP {metric} {help_text}, by endpoint ("{BACKGROUND}" outside requests).',
+                  f'# TYPE {metric} counter']
+        for endpoint in sorted(endpoints):
+            lines.append(f'{metric}{{endpoint="{_label(endpoint)}"}} {endpoints[endpoint][index]}')
+
+    for name, (help_text, fn) in sorted(_gauges.items()):
+        try:
+            value = fn()
+        except Exception as e:
+            logger.error(f"Error reading gauge {name}: {str(e)}")
+            continue
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+    return '\n'.join(lines) + '\n'
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _requests.clear()
+        _endpoints.clear()
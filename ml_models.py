@@ -1,10 +1,25 @@
-import pandas as pd
-import numpy as np
 import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cache import LRUCache
+from lazy import LazyModule
+
+# Loaded on first analytic use so routes like /login don't pay for them
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
 
 logger = logging.getLogger(__name__)
 
+# Prepared full-history frames keyed by user_id -> (transactions version, DataFrame)
+_frame_cache = LRUCache(max_size=128)
+
 def prepare_data(transactions):
+    """
+    Typed DataFrame from get_transactions() output: row dicts or tuples, or the
+    {column: [values]} of get_transactions(columns=True).
+    """
     try:
         # Correctly expect 7 columns now that goal_id is part of the schema
         df = pd.DataFrame(transactions, columns=['id', 'user_id', 'type', 'category', 'amount', 'date', 'goal_id'])
@@ -13,19 +28,45 @@ def prepare_data(transactions):
         if df['date'].isna().any():
             logger.warning("Some transaction dates could not be parsed and will be excluded")
             df = df.dropna(subset=['date'])
+        # Compact, typed columns: low-cardinality strings as categoricals
+        df = df.astype({'type': 'category', 'category': 'category', 'amount': 'float64'})
+        df['goal_id'] = df['goal_id'].fillna(0).astype('int64')
         return df
     except Exception as e:
         logger.error(f"Error preparing data: {str(e)}")
         raise
 
+def get_transactions_df(user_id):
+    """
+    Returns the prepared full-history DataFrame for a user, built at most once per
+    change to their transactions. The frame is shared between callers and must not
+    be modified in place.
+    """
+    from database import get_transactions, get_transactions_version  # Import here to avoid circular imports
+    user_id = int(user_id)
+    version = get_transactions_version(user_id)
+    cached = _frame_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    df = prepare_data(get_transactions(user_id, columns=True))
+    _frame_cache.set(user_id, (version, df))
+    return df
+
+def set_frame_cache_size(max_size):
+    _frame_cache.max_size = int(max_size)
+
 def detect_overspending(df):
     try:
-        category_avgs = df[df['type'] == 'expense'].groupby('category')['amount'].mean()
-        recent = df[df['type'] == 'expense'].sort_values('date').tail(30)
+        # Money sums are taken to the cent before use (here and in ml_numpy/overspending_from_state):
+        # amounts are cents, so the result no longer depends on the order or method of summation
+        by_category = df[df['type'] == 'expense'].groupby('category', observed=True)['amount']
+        category_avgs = by_category.sum().round(2) / by_category.count()
+        # Stable: rows arrive in (date, id) order, so same-day ties keep that order (as recent_expenses does)
+        recent = df[df['type'] == 'expense'].sort_values('date', kind='stable').tail(30)
         overspend = {}
         for cat in category_avgs.index:
-            cat_spend = recent[recent['category'] == cat]['amount'].sum()
-            avg = category_avgs[cat] * (len(recent) / 30)
+            cat_spend = round(float(recent[recent['category'] == cat]['amount'].sum()), 2)
+            avg = float(category_avgs[cat]) * (len(recent) / 30)
             if cat_spend > avg * 1.2:
                 overspend[cat] = round(cat_spend - avg, 2)
         savings_potential = round(sum(overspend.values()), 2)
@@ -34,11 +75,40 @@ def detect_overspending(df):
         logger.error(f"Error in detect_overspending: {str(e)}")
         return {'status': 'error', 'message': str(e)}
 
+def overspending_from_state(category_totals, recent):
+    """
+    detect_overspending from the incrementally maintained expense state
+    (database.get_expense_state): {category: (total, count)} and the latest 30
+    expenses as (category, amount) oldest first. O(categories), whatever the history size.
+    """
+    try:
+        recent_spend = {}
+        for category, amount in recent:
+            recent_spend[category] = recent_spend.get(category, 0) + amount
+        overspend = {}
+        for cat, (total, count) in category_totals.items():
+            # To the cent, like detect_overspending: running totals drift in the last bits
+            cat_spend = round(recent_spend.get(cat, 0), 2)
+            avg = (round(total, 2) / count) * (len(recent) / 30)
+            if cat_spend > avg * 1.2:
+                overspend[cat] = round(cat_spend - avg, 2)
+        savings_potential = round(sum(overspend.values()), 2)
+        return {'overspend': overspend, 'potential_savings': savings_potential}
+    except Exception as e:
+        logger.error(f"Error in overspending_from_state: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+def get_overspending(user_id):
+    """detect_overspending for a user without loading their transactions."""
+    from database import get_expense_state  # Import here to avoid circular imports
+    return overspending_from_state(*get_expense_state(user_id))
+
 # ml_models.py
 def recommend_budget(df):
     try:
         from database import get_budgets  # Import here to avoid circular imports
-        monthly_exp = df[df['type'] == 'expense'].groupby(pd.Grouper(key='date', freq='ME'))['amount'].sum().mean()
+        expenses = df[df['type'] == 'expense']
+        monthly_exp = expenses.groupby(pd.Grouper(key='date', freq='ME'))['amount'].sum().round(2).mean()
         income_avg = df[df['type'] == 'income']['amount'].mean() if not df[df['type'] == 'income'].empty else 0
 
         if pd.isna(monthly_exp) or monthly_exp == 0:
@@ -50,13 +120,16 @@ def recommend_budget(df):
         if total_budget <= 0:
             total_budget = 1000.0
 
-        category_totals = df[df['type'] == 'expense'].groupby('category')['amount'].sum()
+        category_totals = expenses.groupby('category', observed=True)['amount'].sum().round(2)
+        # Latest 30 expenses of each category, from one grouped pass instead of a filter per category
+        recent_spends = (expenses.groupby('category', observed=True).tail(30)
+                         .groupby('category', observed=True)['amount'].sum().round(2))
         total_expenses = category_totals.sum() if not category_totals.empty else 0
         budgets = {}
         savings_tips = {}
 
         # Get saved budgets from database
-        saved_budgets = get_budgets(df['user_id'].iloc[0] if not df.empty else 0)
+        saved_budgets = get_budgets(int(df['user_id'].iloc[0]) if not df.empty else 0)
         
         default_categories = ['Food', 'Transport', 'Utilities', 'Other'] if total_expenses == 0 else category_totals.index
 
@@ -70,7 +143,7 @@ def recommend_budget(df):
                 budget = min(round(total_budget * proportion, 2), total_budget * 0.3)
                 budgets[cat] = max(budget, 10.0)
 
-            recent_spend = df[df['type'] == 'expense'][df['category'] == cat]['amount'].tail(30).sum()
+            recent_spend = recent_spends.get(cat, 0)
             savings_tips[cat] = (f"Reduce {cat} spending by 10% to save ₹{round(recent_spend * 0.1, 2)}"
                                 if recent_spend > budgets[cat] else f"Maintain {cat} spending within budget")
 
@@ -102,7 +175,7 @@ def investment_suggestions(df):
 
 def get_offers(df):
     try:
-        top_cat = df[df['type'] == 'expense'].groupby('category')['amount'].sum().idxmax() if not df[df['type'] == 'expense'].empty else 'Other'
+        top_cat = df[df['type'] == 'expense'].groupby('category', observed=True)['amount'].sum().round(2).idxmax() if not df[df['type'] == 'expense'].empty else 'Other'
         offers = {
             'Food': '10% off on groceries at LocalMart',
             'Travel': '5% cashback on travel bookings',
@@ -114,20 +187,271 @@ def get_offers(df):
         logger.error(f"Error in get_offers: {str(e)}")
         return ['Error fetching offers']
 
-def forecast_expenses(df):
+def monthly_expense_series(df):
+    return df[df['type'] == 'expense'].groupby(pd.Grouper(key='date', freq='ME'))['amount'].sum()
+
+def forecast_from_series(expenses):
+    """ARIMA(1,1,1) one-step forecast of a monthly expense series (mean for short series)."""
     try:
-        expenses = df[df['type'] == 'expense'].groupby(pd.Grouper(key='date', freq='ME'))['amount'].sum()
         if len(expenses) >= 3:
             from statsmodels.tsa.arima.model import ARIMA
             model = ARIMA(expenses, order=(1,1,1))
             model_fit = model.fit()
-            forecast = model_fit.forecast(steps=1)[0]
+            forecast = model_fit.forecast(steps=1).iloc[0]
             return {'next_month_exp': round(forecast, 2)}
         return {'next_month_exp': round(expenses.mean(), 2) if not expenses.empty else 0}
     except Exception as e:
         logger.error(f"Error in forecast_expenses: {str(e)}")
         return {'status': 'error', 'message': str(e)}
 
+def forecast_expenses(df):
+    try:
+        expenses = monthly_expense_series(df)
+    except Exception as e:
+        logger.error(f"Error in forecast_expenses: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+    return forecast_from_series(expenses)
+
+# Background forecasting: fitted results per user_id -> (transactions version, result),
+# fits running in a process pool so requests never wait on statsmodels.
+FORECAST_WORKERS = 2
+# Fit on threads rather than processes; for processes that are pool workers themselves
+FORECAST_THREADS = False
+_forecast_cache = LRUCache(max_size=1024)
+_forecast_pending = {}
+_forecast_lock = threading.Lock()
+_forecast_executor = None
+# spawn, not fork: by the time a fit is submitted this process runs the log
+# listener and recurring scheduler threads, and a forked child could inherit a
+# lock one of them held
+_FORECAST_CONTEXT = multiprocessing.get_context('spawn')
+
+def configure_forecasting(workers=None, cache_size=None, threads=None):
+    """
+    workers=0 fits synchronously in the calling thread (no pool); threads=True
+    runs background fits on a thread pool instead of a process pool.
+    """
+    global FORECAST_WORKERS, FORECAST_THREADS
+    if workers is not None:
+        FORECAST_WORKERS = int(workers)
+    if cache_size is not None:
+        _forecast_cache.max_size = int(cache_size)
+    if threads is not None:
+        FORECAST_THREADS = bool(threads)
+
+def _get_forecast_executor():
+    global _forecast_executor
+    with _forecast_lock:
+        if _forecast_executor is None:
+            if FORECAST_THREADS:
+                _forecast_executor = ThreadPoolExecutor(max_workers=FORECAST_WORKERS, thread_name_prefix='forecast')
+            else:
+                _forecast_executor = ProcessPoolExecutor(max_workers=FORECAST_WORKERS, mp_context=_FORECAST_CONTEXT)
+        return _forecast_executor
+
+def shutdown_forecasting(wait=True):
+    """Stops the background forecast pool, cancelling queued fits; the next fit starts a new one."""
+    global _forecast_executor
+    with _forecast_lock:
+        executor, _forecast_executor = _forecast_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+def _discard_forecast_executor(executor, error):
+    """
+    Drops a pool left broken by a dead worker (it would refuse every later fit);
+    the next fit starts a new one.
+    """
+    global _forecast_executor
+    with _forecast_lock:
+        if _forecast_executor is executor:
+            _forecast_executor = None
+    logger.error(f"Forecast pool broken, starting a new one on the next fit: {str(error)}")
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _store_forecast(user_id, version, result):
+    with _forecast_lock:
+        if _forecast_pending.get(user_id) == version:
+            del _forecast_pending[user_id]
+    if 'status' in result:
+        return  # don't cache failures; the next request retries
+    cached = _forecast_cache.get(user_id)
+    if cached is None or cached[0] <= version:
+        _forecast_cache.set(user_id, (version, result))
+
+def _refresh_forecast(user_id, version, df):
+    with _forecast_lock:
+        if _forecast_pending.get(user_id) == version:
+            return
+        _forecast_pending[user_id] = version
+    expenses = monthly_expense_series(df)
+    if len(expenses) < 3 or FORECAST_WORKERS <= 0:
+        # Not enough history for ARIMA (just a mean), or pool disabled
+        _store_forecast(user_id, version, forecast_from_series(expenses))
+        return
+    try:
+        executor = _get_forecast_executor()
+        try:
+            future = executor.submit(forecast_from_series, expenses)
+        except BrokenProcessPool as e:
+            _discard_forecast_executor(executor, e)
+            executor = _get_forecast_executor()
+            future = executor.submit(forecast_from_series, expenses)
+    except Exception:
+        with _forecast_lock:
+            _forecast_pending.pop(user_id, None)
+        raise
+
+    def done(f):
+        try:
+            result = f.result()
+        except BrokenProcessPool as e:
+            _discard_forecast_executor(executor, e)
+            result = {'status': 'error', 'message': str(e)}
+        except Exception as e:
+            logger.error(f"Background forecast failed for user {user_id}: {str(e)}")
+            result = {'status': 'error', 'message': str(e)}
+        _store_forecast(user_id, version, result)
+    future.add_done_callback(done)
+
+def _load_stored_forecast(user_id, version):
+    """
+    Falls back to the batch job's forecasts table. A stored forecast counts as
+    current (and is cached under this version) when the user's expense totals
+    still match the ones it was computed from.
+    """
+    from database import get_stored_forecast, get_expense_fingerprint  # Import here to avoid circular imports
+    stored = get_stored_forecast(user_id)
+    if stored is None:
+        return None
+    result = {'next_month_exp': stored['next_month_exp']}
+    if (round(stored['expense_total'], 2), stored['expense_count']) == get_expense_fingerprint(user_id):
+        _store_forecast(user_id, version, result)
+        return (version, result)
+    return (-1, result)
+
+def get_cached_forecast(user_id, df=None):
+    """
+    Returns the user's forecast without waiting for a model fit. If the cached
+    fit predates their latest transactions, a refit is started in the background
+    and the old value is returned flagged stale/refreshing. With nothing cached
+    yet, the monthly mean stands in until the fit lands.
+    """
+    from database import get_transactions_version  # Import here to avoid circular imports
+    user_id = int(user_id)
+    version = get_transactions_version(user_id)
+    cached = _forecast_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return dict(cached[1], stale=False, refreshing=False)
+    if _forecast_pending.get(user_id) != version:
+        # Nothing current in this process (and no fit under way for it): the batch
+        # job's stored forecast may be, e.g. right after forecast-all bumped the version
+        stored = _load_stored_forecast(user_id, version)
+        if stored is not None and stored[0] == version:
+            return dict(stored[1], stale=False, refreshing=False)
+        cached = cached or stored
+    if df is None:
+        df = get_transactions_df(user_id)
+    try:
+        _refresh_forecast(user_id, version, df)
+    except Exception as e:
+        logger.error(f"Error scheduling forecast for user {user_id}: {str(e)}")
+    cached = _forecast_cache.get(user_id) or cached
+    if cached is not None and cached[0] == version:
+        return dict(cached[1], stale=False, refreshing=False)
+    if cached is not None:
+        return dict(cached[1], stale=True, refreshing=True)
+    expenses = monthly_expense_series(df)
+    return {'next_month_exp': round(expenses.mean(), 2) if not expenses.empty else 0,
+            'stale': True, 'refreshing': True}
+
+def exponential_smoothing_forecasts(series_list, alpha=0.5):
+    """
+    Simple exponential smoothing one-step forecasts for many series at once.
+    Series are left-aligned into one NaN-padded matrix and smoothed column by
+    column, so the Python loop runs over months rather than users.
+    """
+    if not series_list:
+        return np.array([])
+    lengths = np.array([len(s) for s in series_list])
+    values = np.full((len(series_list), lengths.max()), np.nan)
+    for i, s in enumerate(series_list):
+        values[i, :len(s)] = s
+    level = values[:, 0].copy()
+    for t in range(1, values.shape[1]):
+        active = t < lengths
+        level[active] = alpha * values[active, t] + (1 - alpha) * level[active]
+    return np.round(level, 2)
+
+def _monthly_series_by_user(rows):
+    """Groups get_all_monthly_expenses() rows into gap-filled month-end series like monthly_expense_series()."""
+    by_user = {}
+    for user_id, month, total, count in rows:
+        by_user.setdefault(user_id, []).append((month, total, count))
+    series = {}
+    for user_id, months in by_user.items():
+        try:
+            values = pd.Series({pd.Period(m, freq='M'): t for m, t, _ in months})
+            full = pd.period_range(values.index.min(), values.index.max(), freq='M')
+            values = values.reindex(full, fill_value=0.0)
+            values.index = values.index.to_timestamp(how='end').normalize()
+            values.index.freq = 'ME'
+        except Exception as e:
+            logger.warning(f"Skipping forecast for user {user_id}: {str(e)}")
+            continue
+        fingerprint = (round(sum(t for _, t, _ in months), 2), sum(c for _, _, c in months))
+        series[user_id] = (values, fingerprint)
+    return series
+
+def batch_forecast(workers=None, min_arima_months=3, fast=False, alpha=0.5):
+    """
+    Forecasts next month's expenses for every user and stores them in the
+    forecasts table. All series come from one rollup query; series with at least
+    min_arima_months months are fitted with ARIMA across a process pool, shorter
+    ones (or all, with fast=True) use vectorized exponential smoothing.
+    Returns a stats dict including throughput in users/sec.
+    """
+    import time
+    from database import get_all_monthly_expenses, save_forecasts  # Import here to avoid circular imports
+    started = time.perf_counter()
+    workers = FORECAST_WORKERS if workers is None else workers
+    series = _monthly_series_by_user(get_all_monthly_expenses())
+
+    arima_users = [] if fast else [u for u, (s, _) in series.items() if len(s) >= min_arima_months]
+    arima_set = set(arima_users)
+    smooth_users = [u for u in series if u not in arima_set]
+    results = []
+
+    smoothed = exponential_smoothing_forecasts([series[u][0].to_numpy() for u in smooth_users], alpha)
+    for user_id, value in zip(smooth_users, smoothed):
+        results.append((user_id, float(value), 'exp_smoothing') + series[user_id][1])
+
+    if arima_users:
+        inputs = [series[u][0] for u in arima_users]
+        if workers and workers > 0:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_FORECAST_CONTEXT) as pool:
+                chunksize = max(1, len(inputs) // (workers * 4))
+                fitted = list(pool.map(forecast_from_series, inputs, chunksize=chunksize))
+        else:
+            fitted = [forecast_from_series(s) for s in inputs]
+        for user_id, result in zip(arima_users, fitted):
+            if 'status' in result:
+                continue
+            results.append((user_id, float(result['next_month_exp']), 'arima') + series[user_id][1])
+
+    save_forecasts(results)
+    elapsed = time.perf_counter() - started
+    stats = {
+        'users': len(series),
+        'arima': len(arima_users),
+        'exp_smoothing': len(smooth_users),
+        'saved': len(results),
+        'seconds': round(elapsed, 3),
+        'users_per_sec': round(len(series) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    logger.info(f"Batch forecast: {stats}")
+    return stats
+
 def get_budget_alerts(df, recommended_budgets):
     """
     Compares current monthly spending to recommended budgets and generates alerts.
@@ -135,7 +459,7 @@ def get_budget_alerts(df, recommended_budgets):
     try:
         # Get spending for the current month
         current_month = pd.Timestamp.now().to_period('M')
-        current_month_spending = df[(df['type'] == 'expense') & (df['date'].dt.to_period('M') == current_month)].groupby('category')['amount'].sum()
+        current_month_spending = df[(df['type'] == 'expense') & (df['date'].dt.to_period('M') == current_month)].groupby('category', observed=True)['amount'].sum().round(2)
         
         alerts = []
         # Check for each category if spending exceeds the recommended budget
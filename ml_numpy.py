@@ -0,0 +1,275 @@
+import datetime
+import logging
+from cache import LRUCache
+from lazy import LazyModule
+
+np = LazyModule('numpy')
+
+logger = logging.getLogger(__name__)
+
+# NumPy implementations of the ml_models analytics. They take TransactionArrays
+# (integer-coded columns) instead of a DataFrame and return exactly what the
+# ml_models function of the same name returns; aggregation is done with
+# np.bincount and sort-based grouping instead of repeated boolean masks and groupbys.
+
+TYPE_EXPENSE = 0
+TYPE_INCOME = 1
+TYPE_OTHER = 2
+
+class TransactionArrays:
+    """
+    One user's transactions as parallel NumPy arrays, in the same row order as
+    the DataFrame from ml_models.prepare_data:
+
+    - type_codes: int8, TYPE_EXPENSE / TYPE_INCOME / TYPE_OTHER
+    - category_codes: int32 index into `categories` (sorted, like groupby keys)
+    - amounts: float64
+    - dates: int64 nanoseconds since the epoch (datetime64[ns] viewed as int)
+    """
+    __slots__ = ('user_id', 'type_codes', 'category_codes', 'categories', 'amounts', 'dates')
+
+    def __init__(self, user_id, type_codes, category_codes, categories, amounts, dates):
+        self.user_id = user_id
+        self.type_codes = type_codes
+        self.category_codes = category_codes
+        self.categories = categories
+        self.amounts = amounts
+        self.dates = dates
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @classmethod
+    def from_columns(cls, user_id, types, categories, amounts, dates):
+        types = np.asarray(types, dtype=object)
+        type_codes = np.full(len(types), TYPE_OTHER, dtype=np.int8)
+        type_codes[types == 'expense'] = TYPE_EXPENSE
+        type_codes[types == 'income'] = TYPE_INCOME
+        names, codes = np.unique(np.asarray(categories, dtype=object).astype(str), return_inverse=True)
+        return cls(user_id, type_codes, codes.astype(np.int32), [str(n) for n in names],
+                   np.asarray(amounts, dtype=np.float64),
+                   np.asarray(dates, dtype='datetime64[ns]').view(np.int64))
+
+    @classmethod
+    def from_frame(cls, df):
+        """From a prepared ml_models DataFrame."""
+        user_id = int(df['user_id'].iloc[0]) if len(df) else 0
+        return cls.from_columns(user_id, df['type'].to_numpy(object), df['category'].to_numpy(object),
+                                df['amount'].to_numpy(np.float64), df['date'].to_numpy('datetime64[ns]'))
+
+    @classmethod
+    def from_rows(cls, user_id, rows):
+        """
+        From database.get_transactions() dicts, without building a DataFrame.
+        Rows whose date doesn't parse are dropped, as prepare_data does.
+        """
+        return cls.from_db_columns(user_id, {key: [r[key] for r in rows]
+                                             for key in ('type', 'category', 'amount', 'date')})
+
+    @classmethod
+    def from_db_columns(cls, user_id, columns):
+        """From database.get_transactions(columns=True); unparseable dates dropped as in from_rows."""
+        dates = np.array([_parse_day(d) for d in columns['date']], dtype='datetime64[D]')
+        keep = ~np.isnat(dates)
+        types, categories, amounts = columns['type'], columns['category'], columns['amount']
+        if not keep.all():
+            logger.warning("Some transaction dates could not be parsed and will be excluded")
+            types, categories, amounts = ([v for v, k in zip(col, keep) if k] for col in (types, categories, amounts))
+        return cls.from_columns(user_id, types, categories, amounts, dates[keep])
+
+def _parse_day(value):
+    try:
+        return np.datetime64(str(value)[:10], 'D')
+    except ValueError:
+        return np.datetime64('NaT')
+
+# Per-user arrays keyed by user_id -> (transactions version, TransactionArrays)
+_arrays_cache = LRUCache(max_size=128)
+
+def get_transaction_arrays(user_id):
+    """Cached TransactionArrays for a user, rebuilt when their transactions change."""
+    from database import get_transactions, get_transactions_version  # Import here to avoid circular imports
+    user_id = int(user_id)
+    version = get_transactions_version(user_id)
+    cached = _arrays_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    arrays = TransactionArrays.from_db_columns(user_id, get_transactions(user_id, columns=True))
+    _arrays_cache.set(user_id, (version, arrays))
+    return arrays
+
+def set_arrays_cache_size(max_size):
+    _arrays_cache.max_size = int(max_size)
+
+def _category_sums(ta, mask):
+    """
+    Per-category (sums, counts) over the masked rows, indexed by category code.
+    Sums are to the cent, as in ml_models, so bincount's order of addition can't
+    make them differ from pandas' compensated groupby sums.
+    """
+    k = len(ta.categories)
+    codes = ta.category_codes[mask]
+    return (np.round(np.bincount(codes, weights=ta.amounts[mask], minlength=k), 2),
+            np.bincount(codes, minlength=k))
+
+def _months(dates):
+    return dates.astype('datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+
+def detect_overspending(ta):
+    try:
+        expense = ta.type_codes == TYPE_EXPENSE
+        sums, counts = _category_sums(ta, expense)
+        present = np.flatnonzero(counts)
+        # Stable, like ml_models.detect_overspending, so same-day ties keep row order
+        exp_idx = np.flatnonzero(expense)
+        recent = exp_idx[np.argsort(ta.dates[exp_idx], kind='stable')][-30:]
+        recent_codes = ta.category_codes[recent]
+        recent_amounts = ta.amounts[recent]
+        scale = len(recent) / 30
+        overspend = {}
+        for code in present:
+            cat_spend = round(float(recent_amounts[recent_codes == code].sum()), 2)
+            avg = float(sums[code] / counts[code]) * scale
+            if cat_spend > avg * 1.2:
+                overspend[ta.categories[code]] = round(cat_spend - avg, 2)
+        savings_potential = round(sum(overspend.values()), 2)
+        return {'overspend': overspend, 'potential_savings': savings_potential}
+    except Exception as e:
+        logger.error(f"Error in detect_overspending: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+def _last_n_sums(ta, mask, n):
+    """Sum of the last n masked rows (in row order) per category code, to the cent."""
+    idx = np.flatnonzero(mask)
+    idx = idx[np.argsort(ta.category_codes[idx], kind='stable')]
+    codes = ta.category_codes[idx]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+    ends = np.r_[starts[1:], len(codes)]
+    out = {}
+    for start, end in zip(starts, ends):
+        out[int(codes[start])] = round(ta.amounts[idx[max(start, end - n):end]].sum(), 2)
+    return out
+
+def recommend_budget(ta):
+    try:
+        from database import get_budgets  # Import here to avoid circular imports
+        expense = ta.type_codes == TYPE_EXPENSE
+        income = ta.type_codes == TYPE_INCOME
+        if expense.any():
+            months = _months(ta.dates[expense])
+            first = months.min()
+            monthly = np.round(np.bincount(months - first, weights=ta.amounts[expense]), 2)
+            monthly_exp = monthly.sum() / len(monthly)
+        else:
+            monthly_exp = np.nan
+        income_avg = ta.amounts[income].mean() if income.any() else 0
+
+        if np.isnan(monthly_exp) or monthly_exp == 0:
+            monthly_exp = 1000.0
+        if np.isnan(income_avg):
+            income_avg = 0
+
+        total_budget = round(income_avg * 0.8 if income_avg > 0 else monthly_exp * 1.1, 2)
+        if total_budget <= 0:
+            total_budget = 1000.0
+
+        sums, counts = _category_sums(ta, expense)
+        present = np.flatnonzero(counts)
+        category_totals = {ta.categories[code]: sums[code] for code in present}
+        total_expenses = sums[present].sum() if len(present) else 0
+        budgets = {}
+        savings_tips = {}
+
+        # Get saved budgets from database
+        saved_budgets = get_budgets(ta.user_id if len(ta) else 0)
+
+        default_categories = ['Food', 'Transport', 'Utilities', 'Other'] if total_expenses == 0 else list(category_totals)
+        recent_spends = _last_n_sums(ta, expense, 30)
+        code_of = {name: code for code, name in enumerate(ta.categories)}
+
+        for cat in default_categories:
+            if cat in saved_budgets:
+                budgets[cat] = saved_budgets[cat]['amount']
+            elif total_expenses == 0:
+                budgets[cat] = round(total_budget / len(default_categories), 2)
+            else:
+                proportion = category_totals.get(cat, 0) / total_expenses
+                budget = min(round(total_budget * proportion, 2), total_budget * 0.3)
+                budgets[cat] = max(budget, 10.0)
+
+            recent_spend = recent_spends.get(code_of.get(cat), 0)
+            savings_tips[cat] = (f"Reduce {cat} spending by 10% to save ₹{round(recent_spend * 0.1, 2)}"
+                                if recent_spend > budgets[cat] else f"Maintain {cat} spending within budget")
+
+        warning = "Likely to exceed budget!" if monthly_exp > total_budget else "Spending within budget"
+
+        return {
+            'total': total_budget,
+            'budgets': budgets,
+            'savings_tips': savings_tips,
+            'warning': warning
+        }
+    except Exception as e:
+        logger.error(f"Error in recommend_budget: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+def investment_suggestions(ta):
+    try:
+        income = ta.amounts[ta.type_codes == TYPE_INCOME].sum()
+        expenses = ta.amounts[ta.type_codes == TYPE_EXPENSE].sum()
+        savings_rate = (income - expenses) / income if income > 0 else 0
+        if savings_rate > 0.2:
+            suggestions = ["Invest in Mutual Funds/SIPs (e.g., HDFC Sensex)", "Consider fixed deposits for stable returns"]
+        else:
+            suggestions = ["Build an emergency fund (3-6 months of expenses)", "Start with low-risk bonds"]
+        return suggestions
+    except Exception as e:
+        logger.error(f"Error in investment_suggestions: {str(e)}")
+        return ['Error generating suggestions']
+
+def get_offers(ta):
+    try:
+        sums, counts = _category_sums(ta, ta.type_codes == TYPE_EXPENSE)
+        present = np.flatnonzero(counts)
+        top_cat = ta.categories[present[np.argmax(sums[present])]] if len(present) else 'Other'
+        offers = {
+            'Food': '10% off on groceries at LocalMart',
+            'Travel': '5% cashback on travel bookings',
+            'Shopping': '15% discount on fashion outlets',
+            'Other': 'General cashback on credit card spending'
+        }
+        return [offers.get(top_cat, 'No specific offers available')]
+    except Exception as e:
+        logger.error(f"Error in get_offers: {str(e)}")
+        return ['Error fetching offers']
+
+def get_budget_alerts(ta, recommended_budgets):
+    """
+    Compares current monthly spending to recommended budgets and generates alerts.
+    """
+    try:
+        current_month = np.datetime64(datetime.date.today(), 'M').astype(np.int64)
+        mask = (ta.type_codes == TYPE_EXPENSE) & (_months(ta.dates) == current_month)
+        sums, counts = _category_sums(ta, mask)
+        current_month_spending = {ta.categories[code]: sums[code] for code in np.flatnonzero(counts)}
+
+        alerts = []
+        for category, budgeted_amount in recommended_budgets['budgets'].items():
+            spent_amount = current_month_spending.get(category, 0)
+            if spent_amount > budgeted_amount:
+                over_amount = spent_amount - budgeted_amount
+                alerts.append({
+                    'category': category,
+                    'spent': round(spent_amount, 2),
+                    'budget': round(budgeted_amount, 2),
+                    'over': round(over_amount, 2),
+                    'message': f"You have overspent by ₹{round(over_amount, 2)} in {category} this month. Consider cutting back!"
+                })
+
+        if not alerts:
+            alerts.append({'message': "Great job! You're currently on track with your budget."})
+
+        return {'alerts': alerts}
+    except Exception as e:
+        logger.error(f"Error in get_budget_alerts: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
@@ -0,0 +1,156 @@
+import calendar
+import datetime
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Turns recurring_transactions rules into real transactions. Every rule carries
+# next_due (the next occurrence not yet written); materialize_due() walks the
+# next_due index once, writes all occurrences up to today and advances next_due in
+# the same transaction, so re-running it never duplicates anything.
+
+# frequency -> (unit, step)
+FREQUENCIES = {
+    'daily': ('days', 1),
+    'weekly': ('days', 7),
+    'biweekly': ('days', 14),
+    'monthly': ('months', 1),
+    'quarterly': ('months', 3),
+    'yearly': ('months', 12),
+}
+
+# Rules read and written per transaction
+MATERIALIZE_BATCH_SIZE = 1000
+# Occurrences written per rule per pass (a daily rule a year behind); the rest follow on the next pass
+MAX_OCCURRENCES_PER_RULE = 400
+
+def _to_date(value):
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value)[:10])
+
+def _add_months(start, months):
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return datetime.date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+def next_occurrence(start_date, frequency, due):
+    """
+    The occurrence after `due`. Month-based frequencies are counted from
+    start_date, so a rule starting on the 31st lands on each month's last day
+    without drifting. Returns None for an unknown frequency.
+    """
+    if frequency not in FREQUENCIES:
+        return None
+    unit, step = FREQUENCIES[frequency]
+    start, due = _to_date(start_date), _to_date(due)
+    if unit == 'days':
+        return due + datetime.timedelta(days=step)
+    elapsed = (due.year - start.year) * 12 + due.month - start.month
+    return _add_months(start, (elapsed // step + 1) * step)
+
+def first_due_on_or_after(start_date, frequency, day):
+    """The first occurrence of a rule on or after `day` (start_date itself if that is later)."""
+    due = _to_date(start_date)
+    day = _to_date(day)
+    if frequency not in FREQUENCIES:
+        return None
+    unit, step = FREQUENCIES[frequency]
+    if due >= day:
+        return due
+    # Jump close to `day` first so old rules don't iterate occurrence by occurrence
+    if unit == 'days':
+        due += datetime.timedelta(days=((day - due).days // step) * step)
+    else:
+        elapsed = (day.year - due.year) * 12 + day.month - due.month
+        due = _add_months(due, max(0, elapsed // step - 1) * step)
+    while due < day:
+        due = next_occurrence(start_date, frequency, due)
+    return due
+
+def expand_rule(rule, today):
+    """
+    (occurrence dates up to today, new next_due) for a due rule dict with
+    start_date/frequency/next_due. next_due is None for an unknown frequency,
+    which parks the rule.
+    """
+    if rule['frequency'] not in FREQUENCIES:
+        return [], None
+    due = _to_date(rule['next_due'])
+    dates = []
+    while due is not None and due <= today and len(dates) < MAX_OCCURRENCES_PER_RULE:
+        dates.append(due.isoformat())
+        due = next_occurrence(rule['start_date'], rule['frequency'], due)
+    return dates, due.isoformat() if due else None
+
+def materialize_due(today=None, batch_size=MATERIALIZE_BATCH_SIZE):
+    """
+    Writes every occurrence due up to `today` for all users. Savings income
+    contributes to goals the way /add_transaction does. Returns
+    {'rules', 'transactions'} counts for this pass.
+    """
+    import database  # Import here to avoid circular imports
+    today = _to_date(today or datetime.date.today())
+    stats = {'rules': 0, 'transactions': 0}
+    after = None
+    while True:
+        rules = database.get_due_recurring_transactions(today.isoformat(), after=after, limit=batch_size)
+        if not rules:
+            break
+        after = (rules[-1]['next_due'], rules[-1]['id'])
+        updates = []
+        for rule in rules:
+            dates, next_due = expand_rule(rule, today)
+            if next_due is None:
+                logger.warning(f"Unknown frequency {rule['frequency']!r} for recurring transaction {rule['id']}, parking it")
+            rows = [(rule['type'], rule['category'], rule['amount'], date) for date in dates]
+            updates.append((rule['id'], rule['user_id'], rule['next_due'], next_due, dates[-1] if dates else None, rows))
+        written = database.materialize_recurring(updates, today)
+        if written is None:
+            logger.error(f"Materializing recurring transactions stopped after {stats['transactions']} transactions")
+            break
+        stats['rules'] += len(rules)
+        stats['transactions'] += written
+        if len(rules) < batch_size:
+            break
+    if stats['transactions']:
+        logger.info(f"Materialized {stats['transactions']} recurring transactions from {stats['rules']} rules")
+    return stats
+
+class RecurringScheduler:
+    """
+    Daemon thread that runs materialize_due() every `interval` seconds (and once on
+    start). Safe to run in several processes at once: each rule is advanced with a
+    compare-and-set on next_due, so only one of them writes a given occurrence.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running or self.interval <= 0:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='recurring-scheduler', daemon=True)
+            self._thread.start()
+            logger.info(f"Recurring transaction scheduler started (every {self.interval}s)")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                materialize_due()
+            except Exception as e:
+                logger.error(f"Error materializing recurring transactions: {str(e)}")
+            if self._stop.wait(self.interval):
+                return
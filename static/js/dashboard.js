@@ -1,5 +1,5 @@
 // dashboard.js
-import { showSpinner, hideSpinner, filterTransactions } from './utils.js';
+import { showSpinner, hideSpinner, filterTransactions, decodeColumns } from './utils.js';
 import { showTransactionsModal } from './modals.js';
 
 export async function loadCategories() {
@@ -58,45 +58,33 @@ export async function loadDashboard() {
     console.log('loadDashboard inputs:', { startDate, endDate, period });
 
     try {
-        const transUrl = `/get_transactions${startDate && endDate ? `?start_date=${startDate}&end_date=${endDate}` : ''}`;
-        const vizUrl = `/visualize/${period}${startDate && endDate ? `?start_date=${startDate}&end_date=${endDate}` : ''}`;
-        const monthlySummaryUrl = `/monthly_summary${startDate && endDate ? `?start_date=${startDate}&end_date=${endDate}` : ''}`;
-
-        // Fetch all data in parallel
-        const [
-            transRes, vizRes, goalsRes, netWorthRes,
-            recurringTransRes, monthlySpendingRes, analyzeRes,
-            budgetRes, investRes, offersRes, forecastRes,
-            budgetAlertsRes, monthlySummaryRes
-        ] = await Promise.all([
-            fetch(transUrl),
-            fetch(vizUrl),
-            fetch('/get_goals'),
-            fetch('/net_worth'),
-            fetch('/recurring_transactions'),
-            fetch('/monthly_spending'),
-            fetch('/analyze'),
-            fetch('/budget'),
-            fetch('/investments'),
-            fetch('/offers'),
-            fetch('/forecast'),
-            fetch('/budget_alerts'),
-            fetch(monthlySummaryUrl)
-        ]);
-
-        const trans = await transRes.json();
-        const viz = await vizRes.json();
-        const goals = await goalsRes.json();
-        const netWorthData = await netWorthRes.json();
-        const recurringTrans = await recurringTransRes.json();
-        const monthlySpending = await monthlySpendingRes.json();
-        const analyze = await analyzeRes.json();
-        const budget = await budgetRes.json();
-        const invest = await investRes.json();
-        const offers = await offersRes.json();
-        const forecast = await forecastRes.json();
-        const budgetAlerts = await budgetAlertsRes.json();
-        const monthlySummary = await monthlySummaryRes.json();
+        // Columnar transactions and chart series: a fraction of the row-per-object size
+        const params = new URLSearchParams({ period, format: 'columns' });
+        if (startDate && endDate) {
+            params.set('start_date', startDate);
+            params.set('end_date', endDate);
+        }
+
+        // All widgets come from one aggregated request
+        const dashboardRes = await fetch(`/dashboard?${params.toString()}`);
+        const dashboard = await dashboardRes.json();
+        if (dashboard.status === 'error') {
+            throw new Error(dashboard.message || 'Failed to load dashboard');
+        }
+
+        const trans = decodeColumns(dashboard.transactions);
+        const viz = dashboard.visualize;
+        const goals = dashboard.goals;
+        const netWorthData = dashboard.net_worth;
+        const recurringTrans = dashboard.recurring_transactions;
+        const monthlySpending = dashboard.monthly_spending;
+        const analyze = dashboard.analyze;
+        const budget = dashboard.budget;
+        const invest = dashboard.investments;
+        const offers = dashboard.offers;
+        const forecast = dashboard.forecast;
+        const budgetAlerts = dashboard.budget_alerts;
+        const monthlySummary = dashboard.monthly_summary;
 
         // ✅ Monthly Summary Section
         const monthlyIncomeElement = document.getElementById('monthly-income');
@@ -154,8 +142,9 @@ if (pieChartElement) {
 
     if (viz.status !== 'error' && viz.pie) {
         const pieData = viz.pie || {};
-        const categories = Object.keys(pieData);
-        const amounts = Object.values(pieData);
+        // {labels: [...], data: [...]} with format=columns, else {category: amount}
+        const categories = Array.isArray(pieData.labels) ? pieData.labels : Object.keys(pieData);
+        const amounts = Array.isArray(pieData.data) ? pieData.data : Object.values(pieData);
 
         if (categories.length > 0) {
             window.pieChart = new Chart(pieChartElement, {
@@ -185,8 +174,8 @@ if (pieChartElement) {
                             const category = categories[index];
 
                             try {
-                                const res = await fetch(`/get_transactions?category=${encodeURIComponent(category)}`);
-                                const transactions = await res.json();
+                                const res = await fetch(`/get_transactions?category=${encodeURIComponent(category)}&format=columns`);
+                                const transactions = decodeColumns(await res.json());
 
                                 // Open modal with transactions for this category
                                 showTransactionsModal(transactions, category);
@@ -324,7 +313,7 @@ if (trendChartElement) {
 
         document.getElementById('forecast').innerHTML = forecast.status === 'error'
             ? 'Error loading forecast'
-            : `Next Month's Expense Forecast:<br>₹${(forecast.next_month_exp || 0).toFixed(2)}`;
+            : `Next Month's Expense Forecast:<br>₹${(forecast.next_month_exp || 0).toFixed(2)}${forecast.refreshing ? ' <small class="text-muted">(updating...)</small>' : ''}`;
 
         document.getElementById('budget-alerts-summary').innerHTML = budgetAlerts.status === 'error'
             ? 'Error loading alerts'
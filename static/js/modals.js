@@ -838,7 +838,7 @@ async function loadTrendModal() {
     let period = periodSelect.value || 'monthly';
 
     try {
-        const vizUrl = `/visualize/${period}${startDate && endDate ? `?start_date=${startDate}&end_date=${endDate}` : ''}`;
+        const vizUrl = `/visualize/${period}?format=columns${startDate && endDate ? `&start_date=${startDate}&end_date=${endDate}` : ''}`;
         const response = await fetch(vizUrl);
         const viz = await response.json();
 
@@ -945,7 +945,7 @@ async function loadTrendModal() {
         // Add event listener for period changes
         periodSelect.addEventListener('change', async () => {
             period = periodSelect.value;
-            const newVizUrl = `/visualize/${period}${startDate && endDate ? `?start_date=${startDate}&end_date=${endDate}` : ''}`;
+            const newVizUrl = `/visualize/${period}?format=columns${startDate && endDate ? `&start_date=${startDate}&end_date=${endDate}` : ''}`;
             showSpinner();
             try {
                 const response = await fetch(newVizUrl);
@@ -99,6 +99,24 @@ export function startOnboardingTour() {
     });
 }
 
+// Rows from a format=columns transaction list ({format, length, columns, dictionaries}),
+// as /get_transactions and /dashboard send it; anything else is returned as is.
+export function decodeColumns(payload) {
+    if (!payload || payload.format !== 'columns') return payload;
+    const { length, columns, dictionaries = {} } = payload;
+    const fields = Object.keys(columns);
+    const rows = new Array(length);
+    for (let i = 0; i < length; i++) {
+        const row = {};
+        for (const field of fields) {
+            const value = columns[field][i];
+            row[field] = dictionaries[field] ? dictionaries[field][value] : value;
+        }
+        rows[i] = row;
+    }
+    return rows;
+}
+
 export function filterTransactions(transactions, period, startDate, endDate) {
     if (!transactions || !Array.isArray(transactions)) return [];
     let filtered = transactions;